@@ -0,0 +1,122 @@
+"""Общий на процесс кэш масштабированных изображений.
+
+Ключ — (путь, базовый размер, множитель качества графики, итоговый размер), так что
+повторный старт игры не декодирует PNG и не масштабирует их заново. Итоговый размер
+задаётся, когда изображение качества множителя нужно в другом размере (спрайты 'Авто'
+в размер машины); None — естественный размер множителя. При смене качества графики кэш
+отбрасывает варианты прежнего множителя. Если задана переменная окружения
+PYGAME_ASSET_CACHE_DIR, уже отмасштабированные изображения дополнительно сохраняются
+на диск и при следующем запуске читаются оттуда вместо исходников.
+
+Декодирование и масштабирование идут в QImage, поэтому их можно заранее запустить в
+фоновом потоке через prefetch(); в GUI-потоке остаётся только дешёвое QPixmap.fromImage.
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import Qt, QSize
+from PyQt6.QtGui import QColor, QImage, QPixmap
+
+from engine import BASE_DIR
+
+ASSET_CACHE_DIR_ENV = 'PYGAME_ASSET_CACHE_DIR'
+
+
+def pixmap_format(image):
+    """Переводит картинку в формат, который ей дал бы QPixmap на растровой платформе: RGB32, если
+    все пиксели непрозрачны, иначе ARGB32 с премультиплицированной альфой.
+
+    Масштабирование идёт в этом формате, поэтому результат до пикселя совпадает с прежним
+    QPixmap(path).scaled(); в исходном ARGB32 полупрозрачные края отличались бы на несколько единиц.
+    """
+    if image.hasAlphaChannel():
+        alpha = image.convertToFormat(QImage.Format.Format_Alpha8)
+        bits, stride, width = bytes(alpha.constBits().asarray(alpha.sizeInBytes())), alpha.bytesPerLine(), alpha.width()
+        opaque = b'\xff' * width
+        if any(bits[y * stride:y * stride + width] != opaque for y in range(alpha.height())):
+            return image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+    return image.convertToFormat(QImage.Format.Format_RGB32)
+
+
+class AssetCache:
+    def __init__(self, disk_cache_dir=None):
+        self.pixmaps = {}
+        self.pending = {}  # ключ -> Future с QImage, подготовленным в фоне
+        self.executor = None
+        self.quality_multipliers = ()
+        self.disk_cache_dir = disk_cache_dir
+
+    def set_quality(self, *quality_multipliers):
+        """Переключает качество графики; варианты остальных множителей выгружаются, а их
+        фоновая подготовка отменяется.
+
+        Режиму 'Авто' нужны сразу несколько множителей — он переключается между ними на ходу."""
+        if quality_multipliers == self.quality_multipliers: return
+        self.quality_multipliers = quality_multipliers
+        self.pixmaps = {key: pixmap for key, pixmap in self.pixmaps.items() if key[2] in quality_multipliers}
+        for key in [key for key in self.pending if key[2] not in quality_multipliers]:
+            # Уже начатая подготовка доработает, но её результат никто не заберёт
+            self.pending.pop(key).cancel()
+
+    def prefetch(self, assets, quality_multiplier, sizes=None):
+        """Начинает в фоновом потоке готовить изображения [(путь, базовый размер), ...];
+        sizes — итоговые размеры в том же порядке."""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asset-loader')
+        for (path, base_size), size in zip(assets, sizes or [None] * len(assets)):
+            key = (path, tuple(base_size), quality_multiplier, size)
+            if key in self.pixmaps or key in self.pending: continue
+            self.pending[key] = self.executor.submit(self._load_image, path, base_size, quality_multiplier, size)
+
+    def pixmap(self, path, base_size, quality_multiplier, size=None):
+        key = (path, tuple(base_size), quality_multiplier, size)
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None: return pixmap
+        future = self.pending.pop(key, None)
+        image = (future.result() if future is not None
+                 else self._load_image(path, base_size, quality_multiplier, size))
+        pixmap = self.pixmaps[key] = QPixmap.fromImage(image)
+        return pixmap
+
+    def _load_image(self, path, base_size, quality_multiplier, final_size=None):
+        # Работает и в фоновом потоке: здесь только QImage, без QPixmap
+        size = (int(base_size[0] * quality_multiplier), int(base_size[1] * quality_multiplier))
+        full_path = os.path.join(BASE_DIR, path)
+        if not os.path.exists(full_path):
+            print(f"Warning: Asset not found at {full_path}. Using fallback color.")
+            image = QImage(QSize(*(final_size or size)), QImage.Format.Format_ARGB32_Premultiplied)
+            image.fill(QColor("purple"))
+            return image
+
+        cached_path = self._disk_cache_path(full_path, size, final_size)
+        if cached_path and os.path.exists(cached_path):
+            image = QImage(cached_path)
+            if not image.isNull(): return image
+
+        image = pixmap_format(QImage(full_path)).scaled(QSize(*size), Qt.AspectRatioMode.KeepAspectRatio,
+                                                        Qt.TransformationMode.SmoothTransformation)
+        # Картинка качества множителя, приведённая к итоговому размеру: её рисуют без масштабирования
+        if final_size is not None and (image.width(), image.height()) != tuple(final_size):
+            image = image.scaled(QSize(*final_size), Qt.AspectRatioMode.IgnoreAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        if cached_path:
+            try:
+                os.makedirs(self.disk_cache_dir, exist_ok=True)
+                tmp_path = cached_path + '.tmp'
+                if image.save(tmp_path, 'PNG'): os.replace(tmp_path, cached_path)
+            except OSError as e:
+                print(f"Warning: Could not write asset cache {cached_path}: {e}")
+        return image
+
+    def _disk_cache_path(self, full_path, size, final_size=None):
+        if not self.disk_cache_dir: return None
+        # Имя зависит от содержимого исходника (mtime и размер), так что правка PNG сбрасывает кэш
+        stat = os.stat(full_path)
+        name = f"{full_path}|{stat.st_mtime_ns}|{stat.st_size}|{size[0]}x{size[1]}"
+        if final_size is not None: name += f"|{final_size[0]}x{final_size[1]}"
+        digest = hashlib.sha1(name.encode()).hexdigest()
+        return os.path.join(self.disk_cache_dir, f"{digest[:20]}.png")
+
+
+ASSET_CACHE = AssetCache(os.environ.get(ASSET_CACHE_DIR_ENV) or None)
@@ -0,0 +1,360 @@
+"""Пакетная среда: N независимых партий в массивах NumPy, шаг всех партий — одним вызовом.
+
+Правила те же, что у GameEngine.step, только записанные над массивами: игрок — массивы
+формы (N,), машины соперников — слоты формы (K, N), где K — max_enemies уровня (слот
+впереди, чтобы свёртки по слотам шли поэлементно по длинным строкам). Вместо
+swap-remove машина, ушедшая за нижний край, просто занимает слот с y == gone_y, а порядок
+появления хранится в serial, так что бонус за обгон на тике столкновения считается так же,
+как в движке. Закончившиеся партии сразу
+начинаются заново; их итог остаётся в final_score / final_ticks / final_crashed.
+
+ГСЧ появления машин два:
+  * по умолчанию — один numpy.random.Generator на всю пачку: распределения те же, что у
+    движка, но последовательности другие;
+  * exact=True — у каждой партии свой random.Random(seed) с тем же порядком вызовов, что в
+    GameEngine.spawn_enemy. Медленнее, зато партия совпадает с движком тик в тик — это
+    проверяет verify():
+
+    python batch_env.py verify --level all --games 64 --ticks 5000
+    python batch_env.py bench --level Средний --games 16384 --steps 500
+
+Требует NumPy; сама игра без него работает.
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from engine import (SCREEN_WIDTH, SCREEN_HEIGHT, LEVEL_SETTINGS, GRAPHICS_SETTINGS, INPUT_UP, INPUT_DOWN,
+                    INPUT_LEFT, INPUT_RIGHT, ACCELERATION, BRAKING, NATURAL_DECELERATION, MAX_PLAYER_SPEED,
+                    PLAYER_SIDE_SPEED, ROAD_SCROLL_SPEED, AUTO_ACCEL_SPEED, LANE_MARGIN, SPAWN_MARGIN, MAX_ENEMIES,
+                    OVERTAKE_BONUS, GameEngine, sprite_sizes)
+
+COORD = np.int16  # координаты и размеры: поле 800×700 с запасом помещается, а массивы вдвое короче
+SERIAL = np.int32
+NO_CRASH = np.iinfo(SERIAL).max
+
+# Для каждой из 16 масок ввода: приращение скорости, торможение накатом и его множитель
+SPEED_STEP = np.array([-ACCELERATION if mask & INPUT_UP else BRAKING if mask & INPUT_DOWN else 0.0
+                       for mask in range(16)])
+COASTING = np.array([not mask & (INPUT_UP | INPUT_DOWN) for mask in range(16)])
+COAST_FACTOR = np.where(COASTING, NATURAL_DECELERATION, 1.0)
+
+
+class BatchEnv:
+    def __init__(self, level_name, num_games, player_size=None, enemy_sizes=None, width=SCREEN_WIDTH,
+                 height=SCREEN_HEIGHT, auto_accel=False, seed=0, exact=False, max_ticks=None, level_overrides=None):
+        if player_size is None or enemy_sizes is None:
+            default_player, default_enemies = sprite_sizes()
+            player_size = player_size or default_player
+            enemy_sizes = enemy_sizes or default_enemies
+        conf = {**LEVEL_SETTINGS[level_name], **(level_overrides or {})}
+        self.level_name = level_name
+        self.level_conf = conf
+        self.num_games = n = num_games
+        self.slots = k = conf.get('max_enemies', MAX_ENEMIES)
+        # Суммы булевых масок по слотам в узком типе заметно быстрее, чем в int64 по умолчанию
+        self.count_dtype = np.uint8 if k < 256 else np.int32
+        self.spawn_batch = conf.get('spawn_batch', 1)
+        self.crash_ends_game = conf.get('crash_ends_game', True)
+        self.player_w, self.player_h = player_size
+        self.enemy_sizes = tuple(tuple(size) for size in enemy_sizes)
+        self.sprite_w = np.array([w for w, _ in self.enemy_sizes], dtype=COORD)
+        self.sprite_h = np.array([h for _, h in self.enemy_sizes], dtype=COORD)
+        self.width = width
+        self.height = height
+        # Движок удаляет машину, ушедшую ниже height + 100. Здесь её y просто прижимается к gone_y,
+        # так что пустой слот — это слот с y == gone_y: он ниже игрока и не может ни столкнуться, ни быть обогнан
+        self.gone_y = height + 101
+        self.auto_accel = auto_accel
+        self.exact = exact
+        self.max_ticks = max_ticks
+        # Партии получают зёрна по порядку: сначала 0..N-1, затем перезапуски в порядке номеров партий
+        self.next_seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.rngs = [None] * n
+
+        self.seeds = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.collisions = np.zeros(n, dtype=np.int64)
+        self.player_x = np.zeros(n, dtype=COORD)
+        self.player_y = np.zeros(n, dtype=COORD)
+        self.player_speed = np.zeros(n, dtype=np.float64)
+        self.enemy_timer = np.zeros(n, dtype=np.int64)
+        self.next_serial = np.zeros(n, dtype=SERIAL)
+        self.enemy_x = np.zeros((k, n), dtype=COORD)
+        self.enemy_x_end = np.zeros((k, n), dtype=COORD)  # x + w: правый край не включительно
+        # Размахи пересечения с игроком: ph + h - 2 и pw + w - 2
+        self.enemy_y_span = np.zeros((k, n), dtype=np.uint16)
+        self.enemy_x_span = np.zeros((k, n), dtype=np.uint16)
+        self.enemy_y = np.zeros((k, n), dtype=COORD)
+        self.enemy_w = np.zeros((k, n), dtype=COORD)
+        self.enemy_h = np.zeros((k, n), dtype=COORD)
+        self.enemy_dy = np.zeros((k, n), dtype=COORD)
+        self.enemy_speed = np.zeros((k, n), dtype=np.float64)
+        self.enemy_sprite = np.zeros((k, n), dtype=COORD)
+        self.enemy_serial = np.zeros((k, n), dtype=SERIAL)
+        self.fresh = np.zeros((k, n), dtype=bool)  # машина ещё не обогнана
+        self.final_score = np.zeros(n, dtype=np.int64)
+        self.final_ticks = np.zeros(n, dtype=np.int64)
+        self.final_crashed = np.zeros(n, dtype=bool)
+        self.reset()
+
+    @property
+    def alive(self):
+        return self.enemy_y < self.gone_y
+
+    @property
+    def road_offset_y(self):
+        # Дорога едет с постоянной скоростью, так что сдвиг однозначно задан числом тиков
+        return self.ticks * ROAD_SCROLL_SPEED % self.height
+
+    @property
+    def enemy_count(self):
+        return self.alive.sum(axis=0)
+
+    def reset(self, games=None):
+        """Начинает заново указанные партии (по умолчанию все) со следующими по порядку зёрнами."""
+        games = np.arange(self.num_games) if games is None else np.asarray(games, dtype=np.int64)
+        if not len(games): return
+        seeds = np.arange(self.next_seed, self.next_seed + len(games), dtype=np.int64)
+        self.next_seed += len(games)
+        self.seeds[games] = seeds
+        if self.exact:
+            for game, seed in zip(games.tolist(), seeds.tolist()): self.rngs[game] = random.Random(seed)
+        for array in (self.score, self.ticks, self.collisions, self.player_speed, self.enemy_timer,
+                      self.next_serial):
+            array[games] = 0
+        self.player_x[games] = (self.width - self.player_w) // 2
+        self.player_y[games] = self.height - self.player_h - 20
+        self.enemy_y[:, games] = self.gone_y
+        self.fresh[:, games] = False
+
+    def _spawn(self, games, empty):
+        """По новой машине в первом свободном слоте каждой из партий games; empty — их пустые слоты (K, m)."""
+        m = len(games)
+        if not m: return
+        slot = np.argmax(empty, axis=0)
+        speed_min, speed_max = self.level_conf['enemy_speed_min'], self.level_conf['enemy_speed_max']
+        if self.exact:
+            # Те же вызовы, что в GameEngine.spawn_enemy: choice, randint x, randint y, uniform
+            sprite, x, y, speed = (np.empty(m, dtype=np.int64), np.empty(m, dtype=COORD), np.empty(m, dtype=COORD),
+                                   np.empty(m, dtype=np.float64))
+            sprites = range(len(self.enemy_sizes))
+            for j, game in enumerate(games.tolist()):
+                rng = self.rngs[game]
+                s = rng.choice(sprites)
+                sprite[j] = s
+                x[j] = rng.randint(SPAWN_MARGIN, self.width - SPAWN_MARGIN - self.enemy_sizes[s][0])
+                y[j] = rng.randint(-300, -150)
+                speed[j] = rng.uniform(speed_min, speed_max)
+        else:
+            rng = self.rng
+            sprite = rng.integers(0, len(self.enemy_sizes), m)
+            span = self.width - 2 * SPAWN_MARGIN - self.sprite_w[sprite] + 1
+            x = SPAWN_MARGIN + (rng.random(m) * span).astype(COORD)
+            y = rng.integers(-300, -149, m)
+            speed = speed_min + (speed_max - speed_min) * rng.random(m)
+        w, h = self.sprite_w[sprite], self.sprite_h[sprite]
+        # Запись по плоскому индексу в (K, N) дешевле, чем по паре массивов индексов
+        cell = slot * self.num_games + games
+        serial = self.next_serial[games]
+        for array, values in ((self.enemy_sprite, sprite), (self.enemy_x, x), (self.enemy_x_end, x + w),
+                              (self.enemy_y, y), (self.enemy_w, w), (self.enemy_h, h),
+                              (self.enemy_y_span, self.player_h + h - 2), (self.enemy_x_span, self.player_w + w - 2),
+                              (self.enemy_speed, speed), (self.enemy_dy, speed.astype(COORD)),
+                              (self.enemy_serial, serial), (self.fresh, True)):
+            array.reshape(-1)[cell] = values
+        self.next_serial[games] = serial + 1
+        empty[slot, np.arange(m)] = False
+
+    def step(self, actions):
+        """Один тик всех партий. actions — маски INPUT_* формы (N,). Возвращает (прирост счёта, done)."""
+        actions = np.asarray(actions).astype(np.uint8)
+        self.ticks += 1
+
+        # --- Игрок: скорость, вертикаль, полоса ---
+        if not self.auto_accel:
+            # (v + 0) * 0.98 и (v ± 0.5) * 1 дают ровно те же числа, что ветвления движка
+            actions &= 0x0F
+            speed = (self.player_speed + SPEED_STEP[actions]) * COAST_FACTOR[actions]
+            speed[COASTING[actions] & (np.abs(speed) < 0.1)] = 0.0
+        else:
+            speed = np.full(self.num_games, AUTO_ACCEL_SPEED * NATURAL_DECELERATION)
+        np.clip(speed, -MAX_PLAYER_SPEED, MAX_PLAYER_SPEED, out=speed)
+
+        player_h = self.player_h
+        player_y = self.player_y + speed.astype(COORD)  # astype отбрасывает дробь к нулю, как int()
+        # Упор в верхний или нижний край обнуляет скорость
+        lowest_y = self.height - player_h + 1
+        speed = np.where((player_y < 0) | (player_y > lowest_y), 0.0, speed)
+        np.clip(player_y, 0, lowest_y, out=player_y)
+
+        player_x = self.player_x
+        player_x -= PLAYER_SIDE_SPEED * (((actions & INPUT_LEFT) != 0) & (player_x > LANE_MARGIN))
+        player_x += PLAYER_SIDE_SPEED * (((actions & INPUT_RIGHT) != 0)
+                                         & (player_x + self.player_w - 1 < self.width - LANE_MARGIN))
+        self.player_y = player_y
+        self.player_speed = speed
+
+        reward = (speed < 0).astype(np.int64)
+
+        # --- Появление машин: таймер сбрасывается, только если в партии есть свободный слот ---
+        self.enemy_timer += 1
+        due = np.flatnonzero(self.enemy_timer > self.level_conf['spawn_rate'])
+        if len(due):
+            empty = self.enemy_y[:, due] == self.gone_y
+            has_room = empty.any(axis=0)
+            due, empty = due[has_room], empty[:, has_room]
+            self.enemy_timer[due] = 0
+            for batch in range(self.spawn_batch):
+                if batch:
+                    has_room = empty.any(axis=0)
+                    due, empty = due[has_room], empty[:, has_room]
+                self._spawn(due, empty)
+
+        # --- Движение и обгоны; ушедшие вниз машины прижимаются к gone_y и этим удаляются ---
+        enemy_y = self.enemy_y
+        enemy_y += self.enemy_dy
+        np.minimum(enemy_y, self.gone_y, out=enemy_y)
+        # below — на сколько нижний край машины ниже верхнего края игрока; < 0 — машина обогнана
+        below = enemy_y + self.enemy_h
+        below -= player_y + 1
+        overtaken_now = self.fresh & (below < 0)
+        self.fresh ^= overtaken_now
+        overtakes = overtaken_now.view(np.uint8).sum(axis=0, dtype=self.count_dtype)
+
+        # --- Столкновения: те же неравенства, что у QRect.intersects ---
+        # Пара неравенств lo <= v <= hi сведена к одному беззнаковому сравнению v - lo <= hi - lo
+        hit = ((below.view(np.uint16) <= self.enemy_y_span)
+               & ((self.enemy_x_end - (player_x + 1)).view(np.uint16) <= self.enemy_x_span))
+        crashed = np.zeros(self.num_games, dtype=bool)
+        if hit.any():
+            crashing = np.flatnonzero(hit.any(axis=0))
+            if self.crash_ends_game:
+                crashed[crashing] = True
+                # Бонус только машинам, появившимся не позже первой столкнувшейся
+                serials = self.enemy_serial[:, crashing]
+                crash_serial = np.where(hit[:, crashing], serials, NO_CRASH).min(axis=0)
+                overtakes[crashing] = (overtaken_now[:, crashing] & (serials <= crash_serial)).sum(axis=0,
+                                                                                                  dtype=self.count_dtype)
+            else:
+                self.collisions[crashing] += 1
+        reward += OVERTAKE_BONUS * overtakes.astype(np.int64)
+        self.score += reward
+
+        done = crashed if self.max_ticks is None else crashed | (self.ticks >= self.max_ticks)
+        if done.any():
+            finished = np.flatnonzero(done)
+            self.final_score[finished] = self.score[finished]
+            self.final_ticks[finished] = self.ticks[finished]
+            self.final_crashed[finished] = crashed[finished]
+            self.reset(finished)
+        return reward, done
+
+
+def autopilot_actions(env, lookahead=250):
+    """Векторный вариант simulate.autopilot_driver (при равных y угрожающая машина может быть выбрана иначе)."""
+    left = env.player_x
+    top = env.player_y
+    enemy_bottom = env.enemy_y + env.enemy_h
+    # Пустые слоты (y == gone_y) ниже игрока и под условие по вертикали не попадают
+    threat = ((env.enemy_x < left + (env.player_w + 10)) & (env.enemy_x_end > left - 10)
+              & (top - lookahead < enemy_bottom) & (enemy_bottom <= top + env.player_h))
+    index = np.argmax(np.where(threat, env.enemy_y, np.iinfo(COORD).min), axis=0)[None]
+    x = np.take_along_axis(env.enemy_x, index, 0)[0]
+    w = np.take_along_axis(env.enemy_w, index, 0)[0]
+    bottom = np.take_along_axis(enemy_bottom, index, 0)[0]
+    room_left = x - 110
+    room_right = env.width - 110 - (x + w)
+    steer = np.where(room_left > room_right, INPUT_LEFT, INPUT_RIGHT)
+    evade = steer | np.where(bottom > top - 60, INPUT_DOWN, INPUT_UP)
+    return np.where(threat.any(axis=0), evade, INPUT_UP)
+
+
+def verify(level_name, num_games=64, ticks=5000, seed=0, driver_name='random', graphics='Среднее'):
+    """Играет одни и те же партии на GameEngine и на BatchEnv(exact=True) и сверяет состояние каждый тик.
+
+    Возвращает список расхождений (пустой, если всё совпало)."""
+    from simulate import DRIVERS
+    player_size, enemy_sizes = sprite_sizes(GRAPHICS_SETTINGS[graphics])
+    env = BatchEnv(level_name, num_games, player_size, enemy_sizes, seed=seed, exact=True)
+    engines = [GameEngine(level_name, player_size, enemy_sizes, seed=s) for s in env.seeds.tolist()]
+    drivers = [DRIVERS[driver_name](s) for s in env.seeds.tolist()]
+    mismatches = []
+    for tick in range(ticks):
+        actions = np.array([drive(engine) for drive, engine in zip(drivers, engines)], dtype=np.int64)
+        _, done = env.step(actions)
+        for i, (engine, action) in enumerate(zip(engines, actions.tolist())):
+            crashed = not engine.step(action)
+            if crashed != bool(done[i]):
+                mismatches.append((tick, i, 'done', crashed, bool(done[i])))
+            elif crashed:
+                if engine.score != env.final_score[i]: mismatches.append((tick, i, 'score', engine.score,
+                                                                          int(env.final_score[i])))
+                engine.reset(int(env.seeds[i]))
+                drivers[i] = DRIVERS[driver_name](int(env.seeds[i]))
+            else:
+                pool = engine.enemies
+                expected = (engine.score, engine.player_x, engine.player_y, engine.player_vertical_speed,
+                            sorted((pool.serial[j], pool.x[j], pool.y[j]) for j in range(pool.count)))
+                slots = np.flatnonzero(env.alive[:, i])
+                actual = (int(env.score[i]), int(env.player_x[i]), int(env.player_y[i]), float(env.player_speed[i]),
+                          sorted(zip(env.enemy_serial[slots, i].tolist(), env.enemy_x[slots, i].tolist(),
+                                     env.enemy_y[slots, i].tolist())))
+                if expected != actual: mismatches.append((tick, i, 'state', expected, actual))
+            if len(mismatches) >= 10: return mismatches
+    return mismatches
+
+
+def bench(level_name, num_games, steps, seed=0):
+    """Шагов партий в миллисекунду: только env.step и вместе с векторным автопилотом."""
+    env = BatchEnv(level_name, num_games, seed=seed)
+    actions = autopilot_actions(env)
+    started = time.perf_counter()
+    step_time = 0.0
+    for _ in range(steps):
+        step_started = time.perf_counter()
+        env.step(actions)
+        step_time += time.perf_counter() - step_started
+        actions = autopilot_actions(env)
+    elapsed = time.perf_counter() - started
+    return num_games * steps / step_time / 1000, num_games * steps / elapsed / 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная среда 2D Traffic Racer на NumPy")
+    commands = parser.add_subparsers(dest='command', required=True)
+    verify_parser = commands.add_parser('verify', help="сверить с GameEngine тик в тик")
+    verify_parser.add_argument('--level', choices=list(LEVEL_SETTINGS) + ['all'], default='all')
+    verify_parser.add_argument('--games', type=int, default=64)
+    verify_parser.add_argument('--ticks', type=int, default=5000)
+    verify_parser.add_argument('--seed', type=int, default=0)
+    verify_parser.add_argument('--driver', default='random')
+    bench_parser = commands.add_parser('bench', help="шагов партий в миллисекунду под векторным автопилотом")
+    bench_parser.add_argument('--level', choices=LEVEL_SETTINGS, default='Средний')
+    bench_parser.add_argument('--games', type=int, default=16384)
+    bench_parser.add_argument('--steps', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        step_rate, total_rate = bench(args.level, args.games, args.steps)
+        print(f"{args.level}: {args.games} партий × {args.steps} шагов: step {step_rate:.0f} шагов партий в мс, "
+              f"вместе с автопилотом {total_rate:.0f}")
+        return 0
+    levels = ([name for name, conf in LEVEL_SETTINGS.items() if conf.get('crash_ends_game', True)]
+              if args.level == 'all' else [args.level])
+    failures = 0
+    for level_name in levels:
+        mismatches = verify(level_name, args.games, args.ticks, args.seed, args.driver)
+        print(f"{level_name}: {'OK' if not mismatches else 'РАСХОЖДЕНИЯ'}")
+        for mismatch in mismatches: print(f"  {mismatch}")
+        failures += bool(mismatches)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Замеры стоимости кадра GameWidget без экрана (платформа Qt offscreen).
+
+Для каждой пары уровень × качество графики проигрывается одна и та же партия
+автопилота с фиксированным зерном; отдельно замеряются шаг симуляции (update_game)
+и отрисовка (paintEvent в QImage). Режим 'Авто' замеряется на каждом своём уровне
+отдельно (конфигурации 'Авто/Низкое' и т. д.), с выключенным переключением уровней.
+Результат — JSON, два таких файла можно сравнить:
+
+    python bench.py --out before.json
+    python bench.py --out after.json
+    python bench.py --compare before.json after.json
+"""
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_started = time.perf_counter()
+import main  # noqa: E402  (время импорта входит в замер запуска)
+from PyQt6.QtCore import QT_VERSION_STR  # noqa: E402
+from PyQt6.QtGui import QImage  # noqa: E402
+
+from engine import LEVEL_SETTINGS, GRAPHICS_SETTINGS  # noqa: E402
+from replay import Recorder  # noqa: E402
+from score_store import HIGHSCORE_FILE, JsonScoreStore  # noqa: E402
+from simulate import autopilot_driver  # noqa: E402
+
+WARMUP_FRAMES = 30
+KEYS = tuple((bit, key) for key, bit in main.KEY_INPUTS)
+AUTO_TIER_CONFIGS = tuple(f"{main.AUTO_GRAPHICS}/{tier}" for tier in main.GRAPHICS_TIERS)
+GRAPHICS_CONFIGS = tuple(GRAPHICS_SETTINGS) + AUTO_TIER_CONFIGS
+# Собственные объекты tracemalloc (снимки) в подсчёт выделений кадра не входят
+OWN_TRACES = (tracemalloc.Filter(False, tracemalloc.__file__),)
+
+
+def percentiles(samples):
+    """p50/p95/p99, среднее и максимум в миллисекундах."""
+    ms = sorted(s * 1000 for s in samples)
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    return {'p50': round(cuts[49], 4), 'p95': round(cuts[94], 4), 'p99': round(cuts[98], 4),
+            'mean': round(statistics.fmean(ms), 4), 'max': round(ms[-1], 4)}
+
+
+def restart(widget, level_name, seed, tier=None):
+    widget.start_game(level_name)
+    widget.timer.stop()
+    if tier is not None:
+        # Уровень 'Авто' закреплён: регулятор не должен переключать его посреди замера
+        widget.quality_governor = None
+        widget.set_quality_tier(tier)
+    widget.engine.reset(seed)
+    widget.recorder = Recorder(widget.engine)
+    return autopilot_driver(seed)
+
+
+def run_session(window, level_name, frames, seed, trace_allocations, tier=None):
+    widget = window.game_widget
+    window.start_game(level_name)
+    driver = restart(widget, level_name, seed, tier)
+    image = QImage(widget.size(), QImage.Format.Format_ARGB32_Premultiplied)
+    update_times, paint_times, allocations, peaks = [], [], [], []
+    clock = time.perf_counter
+    for frame in range(WARMUP_FRAMES + frames):
+        if not widget.game_running:
+            seed += 1
+            driver = restart(widget, level_name, seed, tier)
+        mask = driver(widget.engine)
+        widget.keys_pressed = {key for bit, key in KEYS if mask & bit}
+        if trace_allocations:
+            before = tracemalloc.take_snapshot().filter_traces(OWN_TRACES)
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+        t0 = clock()
+        widget.update_game()
+        t1 = clock()
+        if widget.game_running: widget.render(image)
+        t2 = clock()
+        if frame < WARMUP_FRAMES: continue
+        if trace_allocations:
+            # Пик считается от объёма на начало кадра; выделения — блоки, прибавившиеся за кадр
+            # в каждой строке кода (освобождения в других строках их не гасят)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+            after = tracemalloc.take_snapshot().filter_traces(OWN_TRACES)
+            allocations.append(sum(max(stat.count_diff, 0) for stat in after.compare_to(before, 'lineno')))
+        update_times.append(t1 - t0)
+        paint_times.append(t2 - t1)
+    if trace_allocations:
+        return {'alloc_peak_bytes_per_frame': {'p50': int(statistics.median(peaks)), 'max': max(peaks)},
+                'alloc_blocks_per_frame': {'mean': round(statistics.fmean(allocations), 2),
+                                           'max': max(allocations)}}
+    return {'update_ms': percentiles(update_times), 'paint_ms': percentiles(paint_times),
+            'frame_ms': percentiles([u + p for u, p in zip(update_times, paint_times)]),
+            'enemies_at_end': widget.engine.enemies.count}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=main.BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(frames, seed, levels, graphics, trace_allocations):
+    app = main.QApplication.instance() or main.QApplication(sys.argv)
+    # Результаты и записи партий уходят во временный каталог, а не в таблицу рекордов игры
+    scratch = tempfile.TemporaryDirectory(prefix='bench-')
+    settings_manager = main.SettingsManager(JsonScoreStore(os.path.join(scratch.name, HIGHSCORE_FILE)),
+                                            replay_dir=os.path.join(scratch.name, 'replays'))
+    window = main.MainWindow(settings_manager)
+    window.show()
+    app.processEvents()
+    startup_ms = (time.perf_counter() - _started) * 1000
+
+    results = []
+    for graphics_name in graphics:
+        setting, _, tier_name = graphics_name.partition('/')
+        tier = main.GRAPHICS_TIERS.index(tier_name) if tier_name else None
+        window.settings_manager.set_setting('graphics', setting)
+        for level_name in levels:
+            result = run_session(window, level_name, frames, seed, False, tier)
+            if trace_allocations:
+                # tracemalloc сильно замедляет код, поэтому выделения памяти меряются отдельным прогоном той же партии
+                tracemalloc.start()
+                result.update(run_session(window, level_name, frames, seed, True, tier))
+                tracemalloc.stop()
+            results.append({'level': level_name, 'graphics': graphics_name, 'frames': frames, **result})
+            print(f"{level_name:8} {graphics_name:14} update p50 {result['update_ms']['p50']:.3f} "
+                  f"p99 {result['update_ms']['p99']:.3f} ms | paint p50 {result['paint_ms']['p50']:.3f} "
+                  f"p99 {result['paint_ms']['p99']:.3f} ms", file=sys.stderr)
+    window.close()
+    settings_manager.flush()
+    scratch.cleanup()
+    return {
+        'meta': {'revision': git_revision(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 'python': platform.python_version(), 'qt': QT_VERSION_STR, 'platform': platform.platform(),
+                 'frame_mode': main.FRAME_MODE, 'frames': frames, 'seed': seed,
+                 'trace_allocations': trace_allocations},
+        'startup_ms': round(startup_ms, 2),
+        'results': results,
+    }
+
+
+def compare(base_path, new_path):
+    with open(base_path, encoding='utf-8') as f: base = json.load(f)
+    with open(new_path, encoding='utf-8') as f: new = json.load(f)
+    print(f"{base['meta'].get('revision')} -> {new['meta'].get('revision')}")
+    print(f"startup: {base['startup_ms']:.1f} -> {new['startup_ms']:.1f} ms")
+    base_results = {(r['level'], r['graphics']): r for r in base['results']}
+    for result in new['results']:
+        old = base_results.get((result['level'], result['graphics']))
+        if old is None: continue
+        line = [f"{result['level']:8} {result['graphics']:14}"]
+        for metric in ('update_ms', 'paint_ms'):
+            for stat in ('p50', 'p99'):
+                before, after = old[metric][stat], result[metric][stat]
+                change = (after - before) / before * 100 if before else 0.0
+                line.append(f"{metric[:-3]} {stat} {before:.3f}->{after:.3f} ({change:+.0f}%)")
+        print(' | '.join(line))
+    return 0
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры стоимости кадра 2D Traffic Racer")
+    parser.add_argument('--frames', type=int, default=600, help="кадров на каждую конфигурацию")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--level', action='append', choices=LEVEL_SETTINGS, help="по умолчанию все уровни")
+    parser.add_argument('--graphics', action='append', choices=GRAPHICS_CONFIGS, help="по умолчанию все")
+    parser.add_argument('--no-alloc', action='store_true', help="не включать tracemalloc")
+    parser.add_argument('--out', help="куда записать JSON (по умолчанию stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="сравнить два файла результатов")
+    args = parser.parse_args(argv)
+    if args.compare: return compare(*args.compare)
+
+    report = run_benchmarks(args.frames, args.seed, args.level or list(LEVEL_SETTINGS),
+                            args.graphics or list(GRAPHICS_CONFIGS), not args.no_alloc)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f: f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
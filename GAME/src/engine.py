@@ -0,0 +1,351 @@
+"""Игровая логика 2D Traffic Racer без зависимости от Qt.
+
+GameEngine воспроизводит правила GameWidget тик в тик: интегрирование скорости,
+ограничение полосы, появление машин по LEVEL_SETTINGS, бонусы за обгон и столкновения
+с той же семантикой, что у QRect (right/bottom включительно). Виджет лишь рисует
+состояние движка, а тот же движок можно гонять без окна с любой скоростью.
+"""
+import os
+import random
+import struct
+
+# --- Глобальные константы ---
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 700
+FPS = 60
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# max_enemies — предел машин на дороге, spawn_batch — сколько машин появляется за раз,
+# crash_ends_game=False оставляет игру идущей после столкновения (стресс-режим для замеров)
+LEVEL_SETTINGS = {
+    'Легкий': {'enemy_speed_min': 4, 'enemy_speed_max': 7, 'spawn_rate': 70, 'max_enemies': 5},
+    'Средний': {'enemy_speed_min': 6, 'enemy_speed_max': 10, 'spawn_rate': 50, 'max_enemies': 5},
+    'Сложный': {'enemy_speed_min': 9, 'enemy_speed_max': 14, 'spawn_rate': 30, 'max_enemies': 5},
+    'Стресс': {'enemy_speed_min': 1, 'enemy_speed_max': 3, 'spawn_rate': 0, 'max_enemies': 1500, 'spawn_batch': 2,
+               'crash_ends_game': False}
+}
+# Уровни для игроков: стресс-уровни не показываются в меню и не попадают в результаты
+PLAYABLE_LEVELS = tuple(name for name, conf in LEVEL_SETTINGS.items() if conf.get('crash_ends_game', True))
+
+GRAPHICS_SETTINGS = {'Низкое': 0.8, 'Среднее': 1.0, 'Высокое': 1.2}
+
+PLAYER_CAR_IMAGE = os.path.join('assets', 'images', 'player_car.png')
+ENEMY_CAR_IMAGES = (os.path.join('assets', 'images', 'enemy_car_1.png'),
+                    os.path.join('assets', 'images', 'enemy_car_2.png'))
+CAR_BASE_SIZE = (50, 100)
+
+# --- Биты управления (одно нажатие = один бит в маске тика) ---
+INPUT_UP = 1
+INPUT_DOWN = 2
+INPUT_LEFT = 4
+INPUT_RIGHT = 8
+
+# --- Физика игрока (значения из прежнего GameWidget.start_game) ---
+ACCELERATION = 0.5
+BRAKING = 0.5
+NATURAL_DECELERATION = 0.98
+MAX_PLAYER_SPEED = 15
+PLAYER_SIDE_SPEED = 8
+ROAD_SCROLL_SPEED = 5
+AUTO_ACCEL_SPEED = -5
+LANE_MARGIN = 110
+SPAWN_MARGIN = 120
+MAX_ENEMIES = 5
+OVERTAKE_BONUS = 150
+LANE_BUCKET_WIDTH = 32  # ширина полосы-корзины для грубой фазы столкновений, px
+
+
+# --- Размеры спрайтов без загрузки изображений ---
+def png_size(path):
+    """Возвращает (ширина, высота) PNG по заголовку IHDR или None, если файла нет."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(24)
+    except OSError:
+        return None
+    if len(header) < 24 or header[:8] != b'\x89PNG\r\n\x1a\n':
+        return None
+    return struct.unpack('>II', header[16:24])
+
+
+def fit_size(source, target):
+    """Размер после QPixmap.scaled(target, KeepAspectRatio) — та же целочисленная арифметика, что в QSize."""
+    sw, sh = source
+    tw, th = target
+    rw = th * sw // sh
+    if rw <= tw:
+        return rw, th
+    return tw, tw * sh // sw
+
+
+def scaled_sprite_size(path, base_size, quality_multiplier):
+    size = (int(base_size[0] * quality_multiplier), int(base_size[1] * quality_multiplier))
+    source = png_size(os.path.join(BASE_DIR, path))
+    # Как и в load_pixmap: отсутствующий файл заменяется заливкой полного размера
+    return fit_size(source, size) if source else size
+
+
+def sprite_sizes(quality_multiplier=GRAPHICS_SETTINGS['Среднее']):
+    """Размеры машины игрока и машин соперников для заданного качества графики."""
+    player_size = scaled_sprite_size(PLAYER_CAR_IMAGE, CAR_BASE_SIZE, quality_multiplier)
+    enemy_sizes = tuple(scaled_sprite_size(path, CAR_BASE_SIZE, quality_multiplier) for path in ENEMY_CAR_IMAGES)
+    return player_size, enemy_sizes
+
+
+def new_seed():
+    """Случайное зерно для новой партии; вместе с записью ввода оно полностью определяет игру."""
+    return random.SystemRandom().getrandbits(63)
+
+
+class EnemyPool:
+    """Машины соперников в параллельных массивах фиксированной ёмкости.
+
+    Живые машины занимают индексы [0, count); при удалении на место выбывшей
+    переносится последняя живая (swap-remove), а слоты за count служат запасом для
+    новых машин, так что шаг игры не создаёт объектов. serial — порядковый номер
+    появления: по нему восстанавливается прежний порядок обработки машин.
+
+    Машины не двигаются по горизонтали, поэтому каждая один раз заносится в корзины
+    lanes по своему диапазону x шириной LANE_BUCKET_WIDTH. Проверять столкновение
+    нужно только с машинами из корзин, которые перекрывает игрок.
+    """
+    __slots__ = ('capacity', 'count', 'next_serial', 'x', 'y', 'w', 'h', 'dy', 'speed', 'sprite', 'overtaken',
+                 'serial', 'lanes')
+
+    def __init__(self, capacity, width=SCREEN_WIDTH):
+        self.capacity = capacity
+        self.lanes = [[] for _ in range(width // LANE_BUCKET_WIDTH + 1)]
+        self.x = [0] * capacity
+        self.y = [0] * capacity
+        self.w = [0] * capacity
+        self.h = [0] * capacity
+        self.dy = [0] * capacity  # смещение за тик: int(speed), как в прежнем moveTop
+        self.speed = [0.0] * capacity
+        self.sprite = [0] * capacity
+        self.overtaken = [False] * capacity
+        self.serial = [0] * capacity
+        self.clear()
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+        self.next_serial = 0
+        for lane in self.lanes: lane.clear()
+
+    def lane_span(self, x, w):
+        """Диапазон индексов корзин (включительно), которые задевает отрезок [x, x + w)."""
+        last_lane = len(self.lanes) - 1
+        return max(0, min(x // LANE_BUCKET_WIDTH, last_lane)), max(0, min((x + w - 1) // LANE_BUCKET_WIDTH, last_lane))
+
+    def add(self, x, y, w, h, speed, sprite):
+        """Занимает свободный слот и возвращает его индекс, либо -1, если пул полон."""
+        i = self.count
+        if i >= self.capacity: return -1
+        self.x[i] = x
+        self.y[i] = y
+        self.w[i] = w
+        self.h[i] = h
+        self.speed[i] = speed
+        self.dy[i] = int(speed)
+        self.sprite[i] = sprite
+        self.overtaken[i] = False
+        self.serial[i] = self.next_serial
+        self.next_serial += 1
+        self.count = i + 1
+        first, last = self.lane_span(x, w)
+        for lane in range(first, last + 1): self.lanes[lane].append(i)
+        return i
+
+    def reserve(self, capacity):
+        """Расширяет пул до capacity слотов; живые машины и их номера не меняются."""
+        extra = capacity - self.capacity
+        if extra <= 0: return
+        for name in ('x', 'y', 'w', 'h', 'dy', 'sprite', 'serial'): getattr(self, name).extend([0] * extra)
+        self.speed.extend([0.0] * extra)
+        self.overtaken.extend([False] * extra)
+        self.capacity = capacity
+
+    def remove(self, i):
+        lanes = self.lanes
+        first, end = self.lane_span(self.x[i], self.w[i])
+        for lane in range(first, end + 1): lanes[lane].remove(i)
+        last = self.count - 1
+        if i != last:
+            first, end = self.lane_span(self.x[last], self.w[last])
+            for lane in range(first, end + 1):
+                slots = lanes[lane]
+                slots[slots.index(last)] = i
+            self.x[i] = self.x[last]
+            self.y[i] = self.y[last]
+            self.w[i] = self.w[last]
+            self.h[i] = self.h[last]
+            self.speed[i] = self.speed[last]
+            self.dy[i] = self.dy[last]
+            self.sprite[i] = self.sprite[last]
+            self.overtaken[i] = self.overtaken[last]
+            self.serial[i] = self.serial[last]
+        self.count = last
+
+
+class GameEngine:
+    """Одна партия. Вызывайте step(inputs) раз в тик, пока running истинно.
+
+    level_overrides подменяет отдельные параметры уровня (например, spawn_rate) — для подбора сложности.
+    spawn_source заменяет появление машин по таймеру и ГСЧ: объект с методами reset() и
+    spawn(engine), который сам добавляет машины в engine.enemies (см. traffic.ScheduleSource);
+    сбросив engine.running, источник заканчивает партию на этом тике (кончилось расписание).
+    """
+
+    def __init__(self, level_name, player_size=None, enemy_sizes=None, width=SCREEN_WIDTH, height=SCREEN_HEIGHT,
+                 auto_accel=False, seed=None, max_enemies=None, level_overrides=None, spawn_source=None):
+        if player_size is None or enemy_sizes is None:
+            default_player, default_enemies = sprite_sizes()
+            player_size = player_size or default_player
+            enemy_sizes = enemy_sizes or default_enemies
+        self.level_name = level_name
+        self.level_conf = LEVEL_SETTINGS[level_name]
+        if level_overrides: self.level_conf = {**self.level_conf, **level_overrides}
+        self.player_w, self.player_h = player_size
+        self.enemy_sizes = tuple(enemy_sizes)
+        self.width = width
+        self.height = height
+        self.auto_accel = auto_accel
+        self.max_enemies = max_enemies or self.level_conf.get('max_enemies', MAX_ENEMIES)
+        self.spawn_batch = self.level_conf.get('spawn_batch', 1)
+        self.crash_ends_game = self.level_conf.get('crash_ends_game', True)
+        self.enemies = EnemyPool(self.max_enemies, width)
+        self.overtaken_now = []  # номера машин, обогнанных на текущем тике
+        self.spawn_source = spawn_source
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.running = True
+        self.score = 0
+        self.ticks = 0
+        self.collisions = 0
+        self.player_vertical_speed = 0
+        self.player_x = (self.width - self.player_w) // 2
+        self.player_y = self.height - self.player_h - 20
+        self.prev_player_x = self.player_x
+        self.prev_player_y = self.player_y
+        self.is_accelerating = False
+        self.is_braking = False
+        self.enemies.clear()
+        self.enemy_timer = 0
+        self.road_offset_y = 0
+        if self.spawn_source is not None: self.spawn_source.reset()
+
+    def spawn_enemy(self):
+        rng = self.rng
+        # Порядок обращений к ГСЧ совпадает с прежним кодом: choice, затем Enemy.__init__
+        sprite = rng.choice(range(len(self.enemy_sizes)))
+        w, h = self.enemy_sizes[sprite]
+        x = rng.randint(SPAWN_MARGIN, self.width - SPAWN_MARGIN - w)
+        y = rng.randint(-300, -150)
+        speed_offset = rng.uniform(self.level_conf['enemy_speed_min'], self.level_conf['enemy_speed_max'])
+        self.enemies.add(x, y, w, h, speed_offset, sprite)
+
+    def step(self, inputs):
+        """Продвигает игру на один тик. inputs — маска INPUT_*. Возвращает running."""
+        if not self.running: return False
+        self.ticks += 1
+        # Положение до шага нужно для интерполяции при отрисовке между тиками
+        self.prev_player_x = self.player_x
+        self.prev_player_y = self.player_y
+
+        is_accelerating = False
+        is_braking = False
+        speed = self.player_vertical_speed
+        if not self.auto_accel:
+            if inputs & INPUT_UP:
+                speed -= ACCELERATION
+                is_accelerating = True
+            elif inputs & INPUT_DOWN:
+                speed += BRAKING
+                is_braking = True
+        else:
+            speed = AUTO_ACCEL_SPEED
+
+        if not is_accelerating and not is_braking:
+            speed *= NATURAL_DECELERATION
+            if abs(speed) < 0.1: speed = 0
+
+        speed = max(-MAX_PLAYER_SPEED, min(speed, MAX_PLAYER_SPEED))
+        height = self.height
+        player_y = self.player_y + int(speed)
+        if player_y < 0:
+            player_y = 0
+            speed = 0
+        if player_y + self.player_h - 1 > height:
+            player_y = height - self.player_h + 1
+            speed = 0
+        self.player_y = player_y
+        self.player_vertical_speed = speed
+        self.is_accelerating = is_accelerating
+        self.is_braking = is_braking
+
+        player_x = self.player_x
+        if inputs & INPUT_LEFT and player_x > LANE_MARGIN:
+            player_x -= PLAYER_SIDE_SPEED
+        if inputs & INPUT_RIGHT and player_x + self.player_w - 1 < self.width - LANE_MARGIN:
+            player_x += PLAYER_SIDE_SPEED
+        self.player_x = player_x
+
+        self.road_offset_y = (self.road_offset_y + ROAD_SCROLL_SPEED) % height
+        if speed < 0: self.score += 1
+
+        if self.spawn_source is not None:
+            self.spawn_source.spawn(self)
+        else:
+            self.enemy_timer += 1
+            if self.enemy_timer > self.level_conf['spawn_rate'] and self.enemies.count < self.max_enemies:
+                self.enemy_timer = 0
+                for _ in range(self.spawn_batch):
+                    if self.enemies.count >= self.max_enemies: break
+                    self.spawn_enemy()
+
+        # Все машины сдвигаются за один проход. Прежний код обходил их в порядке появления
+        # и останавливался на первом столкновении, поэтому бонус за обгон засчитывается
+        # только машинам, появившимся не позже первой столкнувшейся.
+        player_bottom = player_y + self.player_h - 1
+        pool = self.enemies
+        ys, hs, dys = pool.y, pool.h, pool.dy
+        overtaken, serials = pool.overtaken, pool.serial
+        overtaken_now = self.overtaken_now
+        limit = height + 100
+        for i in range(pool.count - 1, -1, -1):
+            y = ys[i] + dys[i]
+            ys[i] = y
+            if not overtaken[i] and y + hs[i] - 1 < player_y:
+                overtaken[i] = True
+                overtaken_now.append(serials[i])
+            if y > limit: pool.remove(i)
+
+        # Грубая фаза: только машины из корзин под игроком; узкая — та же проверка, что у QRect.intersects
+        player_right = player_x + self.player_w - 1
+        xs, ws, lanes = pool.x, pool.w, pool.lanes
+        crash_serial = -1
+        first, last = pool.lane_span(player_x, self.player_w)
+        for lane in range(first, last + 1):
+            for i in lanes[lane]:
+                y = ys[i]
+                if (y <= player_bottom and player_y <= y + hs[i] - 1
+                        and xs[i] <= player_right and player_x <= xs[i] + ws[i] - 1):
+                    if crash_serial < 0 or serials[i] < crash_serial: crash_serial = serials[i]
+
+        if crash_serial >= 0 and not self.crash_ends_game:
+            self.collisions += 1
+            crash_serial = -1
+        if overtaken_now:
+            for serial in overtaken_now:
+                if crash_serial < 0 or serial <= crash_serial: self.score += OVERTAKE_BONUS
+            overtaken_now.clear()
+        if crash_serial >= 0:
+            self.running = False
+            return False
+        return self.running
@@ -0,0 +1,507 @@
+"""Гонка с призраками: машины игроков с других автоматов поверх своей дороги.
+
+Каждая партия на каждом тике публикует на сервер положение, скорость и счёт машины
+игрока, а сервер раз в тик рассылает игрокам уровня снимок состояний всех участников.
+Игроки одного уровня — комната; снимок кодируется один раз на комнату, и один и тот же
+bytes уходит всем её клиентам.
+
+Протокол бинарный: кадр — длина (u32) и сообщение, первый байт которого — тип.
+Положение квантуется до пикселя, скорость — до 1/SPEED_QUANT, и передаются только
+изменения относительно прошлого сообщения: однобайтовые дельты, а если они не
+помещаются — абсолютные значения. TCP доставляет кадры по порядку, поэтому цепочка
+дельт не рвётся; новый или отставший клиент получает полный (ключевой) снимок.
+
+Клиент работает в фоновом потоке со своим циклом asyncio. Отрисовка только берёт
+последние снимки и интерполирует между ними, отставая на INTERP_DELAY, так что кадр
+никогда не ждёт сокет.
+
+    python ghosts.py serve                          # сервер на 127.0.0.1:8765
+    python ghosts.py bots --count 20 --level Средний
+    PYGAME_GHOSTS=127.0.0.1:8765 python main.py
+    PYGAME_GHOSTS=local python main.py              # сервер поднимается прямо в игре
+"""
+import argparse
+import asyncio
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+from engine import FPS, LEVEL_SETTINGS, GameEngine, sprite_sizes
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+LOCAL_SERVER = 'local'  # адрес, при котором клиент сам запускает сервер на DEFAULT_HOST:DEFAULT_PORT
+SPEED_QUANT = 16  # скорость передаётся в 1/16 px за тик
+INTERP_DELAY = 0.1  # на сколько секунд отрисовка отстаёт от последнего снимка
+HISTORY = 16  # сколько последних снимков хранит клиент: с запасом больше INTERP_DELAY * FPS
+MAX_CLIENT_BUFFER = 1 << 16  # клиенту с таким неотправленным хвостом снимки не пишутся, пока он не догонит
+RECONNECT_DELAY = 2.0
+
+# --- Сообщения ---
+MSG_JOIN, MSG_WELCOME, MSG_STATE, MSG_LEAVE, MSG_SNAPSHOT = range(1, 6)
+SNAPSHOT_KEYFRAME = 1
+
+_LENGTH = struct.Struct('<I')
+_WELCOME = struct.Struct('<BH')  # тип, номер игрока
+_SNAPSHOT = struct.Struct('<BBIH')  # тип, флаги, номер тика сервера, число записей
+_ID = struct.Struct('<H')
+
+# --- Записи состояния: флаги и поля, изменившиеся с прошлой записи ---
+# Состояние — (x, y, скорость * SPEED_QUANT, счёт). Дельта x, y и скорости — int8, счёта — uint8;
+# F_ABSOLUTE — все четыре поля целиком, F_GONE — игрок вышел.
+F_X, F_Y, F_SPEED, F_SCORE, F_ABSOLUTE, F_GONE = 1, 2, 4, 8, 16, 32
+_DELTA_FIELDS = ((F_X, -128, 127), (F_Y, -128, 127), (F_SPEED, -128, 127), (F_SCORE, 0, 255))
+_ABSOLUTE = struct.Struct('<BhhhI')
+GONE_RECORD = bytes((F_GONE,))
+UNCHANGED_RECORD = bytes((0,))
+
+
+def quantize(x, y, speed, score):
+    clamp = lambda value: max(-32768, min(32767, value))
+    return clamp(int(x)), clamp(int(y)), clamp(round(speed * SPEED_QUANT)), int(score)
+
+
+def encode_record(prev, state):
+    """Запись state относительно prev; без prev или при большой разнице — абсолютная."""
+    if prev is not None:
+        flags = 0
+        deltas = bytearray()
+        for (bit, low, high), old, new in zip(_DELTA_FIELDS, prev, state):
+            delta = new - old
+            if not delta: continue
+            if not low <= delta <= high: break
+            flags |= bit
+            deltas.append(delta & 0xFF)
+        else:
+            return bytes((flags,)) + deltas
+    return _ABSOLUTE.pack(F_ABSOLUTE, *state)
+
+
+def decode_record(data, offset, prev):
+    """Возвращает (состояние или None для вышедшего игрока, смещение следующей записи)."""
+    flags = data[offset]
+    if flags & F_GONE: return None, offset + 1
+    if flags & F_ABSOLUTE:
+        _, *state = _ABSOLUTE.unpack_from(data, offset)
+        return tuple(state), offset + _ABSOLUTE.size
+    if prev is None: raise ValueError("дельта без ключевого снимка")
+    offset += 1
+    state = list(prev)
+    for i, (bit, low, _) in enumerate(_DELTA_FIELDS):
+        if flags & bit:
+            delta = data[offset]
+            offset += 1
+            state[i] += delta - 256 if low < 0 and delta > 127 else delta
+    return tuple(state), offset
+
+
+def record_size(flags):
+    """Длина записи по её флагам — чтобы пропустить запись, не декодируя её."""
+    if flags & F_GONE: return 1
+    if flags & F_ABSOLUTE: return _ABSOLUTE.size
+    return 1 + sum(1 for bit, _, _ in _DELTA_FIELDS if flags & bit)
+
+
+def frame(message):
+    return _LENGTH.pack(len(message)) + message
+
+
+async def read_message(reader):
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return await reader.readexactly(length)
+
+
+def join_message(level_name):
+    return frame(bytes((MSG_JOIN,)) + level_name.encode('utf-8'))
+
+
+def state_message(record):
+    return frame(bytes((MSG_STATE,)) + record)
+
+
+# --- Сервер ---
+class GhostRoom:
+    """Игроки одного уровня: последние присланные состояния и состояния на момент прошлой рассылки."""
+
+    def __init__(self):
+        self.clients = {}  # номер игрока -> GhostConnection
+        self.states = {}
+        self.sent = {}
+
+    def encode_delta(self, seq):
+        records = []
+        sent = self.sent
+        for player, state in self.states.items():
+            old = sent.get(player)
+            if old == state: continue
+            records.append(_ID.pack(player) + encode_record(old, state))
+            sent[player] = state
+        for player in [player for player in sent if player not in self.states]:
+            records.append(_ID.pack(player) + GONE_RECORD)
+            del sent[player]
+        return frame(_SNAPSHOT.pack(MSG_SNAPSHOT, 0, seq, len(records)) + b''.join(records))
+
+    def encode_keyframe(self, seq):
+        records = [_ID.pack(player) + encode_record(None, state) for player, state in self.sent.items()]
+        return frame(_SNAPSHOT.pack(MSG_SNAPSHOT, SNAPSHOT_KEYFRAME, seq, len(records)) + b''.join(records))
+
+
+class GhostConnection:
+    __slots__ = ('player', 'writer', 'room', 'needs_keyframe')
+
+    def __init__(self, player, writer):
+        self.player = player
+        self.writer = writer
+        self.room = None
+        self.needs_keyframe = True
+
+
+class GhostServer:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.rooms = {}  # уровень -> GhostRoom
+        self.next_player = 1
+        self.seq = 0
+        self.bytes_sent = 0
+        self.server = None
+        self.ticker = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.ticker = asyncio.get_running_loop().create_task(self.broadcast_loop())
+
+    def close(self):
+        if self.ticker is not None: self.ticker.cancel()
+        if self.server is not None: self.server.close()
+
+    @property
+    def client_count(self):
+        return sum(len(room.clients) for room in self.rooms.values())
+
+    async def handle(self, reader, writer):
+        connection = GhostConnection(self.next_player, writer)
+        self.next_player = self.next_player % 0xFFFF + 1
+        try:
+            while True:
+                message = await read_message(reader)
+                kind = message[0]
+                room = connection.room
+                if kind == MSG_STATE:
+                    if room is None: continue
+                    state, _ = decode_record(message, 1, room.states.get(connection.player))
+                    if state is not None: room.states[connection.player] = state
+                elif kind == MSG_JOIN:
+                    self.leave(connection)
+                    room = connection.room = self.rooms.setdefault(message[1:].decode('utf-8'), GhostRoom())
+                    room.clients[connection.player] = connection
+                    connection.needs_keyframe = True
+                    writer.write(frame(_WELCOME.pack(MSG_WELCOME, connection.player)))
+                elif kind == MSG_LEAVE:
+                    self.leave(connection)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, IndexError, struct.error):
+            pass
+        finally:
+            self.leave(connection)
+            writer.close()
+
+    @staticmethod
+    def leave(connection):
+        room = connection.room
+        if room is None: return
+        # Запись о выходе уйдёт остальным со следующей рассылкой: игрок останется в room.sent
+        room.clients.pop(connection.player, None)
+        room.states.pop(connection.player, None)
+        connection.room = None
+
+    async def broadcast_loop(self):
+        loop = asyncio.get_running_loop()
+        step = 1 / FPS
+        deadline = loop.time()
+        while True:
+            deadline += step
+            delay = deadline - loop.time()
+            if delay < -step * 5: deadline = loop.time()  # сильно отстали (сон, отладчик) — без догоняющей пачки
+            await asyncio.sleep(max(0.0, delay))
+            self.broadcast()
+
+    def broadcast(self):
+        """Рассылает всем комнатам снимок тика: дельта общая для комнаты, ключевой снимок — для новых и отставших."""
+        self.seq += 1
+        for level_name, room in list(self.rooms.items()):
+            if not room.clients and not room.sent:
+                del self.rooms[level_name]
+                continue
+            delta = room.encode_delta(self.seq)
+            keyframe = None
+            for connection in room.clients.values():
+                writer = connection.writer
+                if writer.transport.is_closing(): continue
+                if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                    # Пропущенная дельта рвёт цепочку — клиент продолжит с ключевого снимка
+                    connection.needs_keyframe = True
+                    continue
+                if connection.needs_keyframe:
+                    if keyframe is None: keyframe = room.encode_keyframe(self.seq)
+                    data = keyframe
+                    connection.needs_keyframe = False
+                else:
+                    data = delta
+                writer.write(data)
+                self.bytes_sent += len(data)
+
+
+# --- Клиент ---
+class GhostClient:
+    """Связь игры с сервером призраков в фоновом потоке.
+
+    join, publish и leave вызываются из GUI-потока и только ставят работу в цикл клиента;
+    positions возвращает интерполированные положения остальных игроков.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, serve=False):
+        self.host = host
+        self.port = port
+        self.serve = serve
+        self.lock = threading.Lock()
+        self.frames = deque(maxlen=HISTORY)  # (время сервера, {игрок: (x, y)})
+        self.clock_offset = None  # локальное время минус время сервера, по самому быстрому снимку
+        self.known = {}
+        # После входа в комнату (и переподключения) снимки до ключевого — ещё для прежней комнаты
+        # или относятся к состояниям, которых клиент не видел; они отбрасываются
+        self.awaiting_keyframe = True
+        self.player = None
+        self.level_name = None
+        self.last_sent = None
+        self.writer = None
+        self.server = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.run(),),
+                                       name='ghost-client', daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_address(cls, address):
+        """'host:port' или LOCAL_SERVER."""
+        if address == LOCAL_SERVER: return cls(serve=True)
+        host, _, port = address.rpartition(':')
+        return cls(host or DEFAULT_HOST, int(port))
+
+    def join(self, level_name):
+        self.loop.call_soon_threadsafe(self._join, level_name)
+
+    def publish(self, x, y, speed, score):
+        self.loop.call_soon_threadsafe(self._publish, quantize(x, y, speed, score))
+
+    def leave(self):
+        self.loop.call_soon_threadsafe(self._leave)
+
+    def positions(self, now=None):
+        """[(x, y), ...] остальных игроков на момент now - INTERP_DELAY."""
+        with self.lock:
+            if not self.frames: return []
+            render_time = (time.monotonic() if now is None else now) - self.clock_offset - INTERP_DELAY
+            newer = None
+            for older in reversed(self.frames):
+                if older[0] <= render_time: break
+                newer = older
+        if newer is None: return list(older[1].values())
+        if older is newer or older[0] > render_time: return list(newer[1].values())
+        t = (render_time - older[0]) / (newer[0] - older[0])
+        previous = older[1]
+        result = []
+        for player, (x, y) in newer[1].items():
+            old = previous.get(player)
+            if old is not None:
+                x = old[0] + round((x - old[0]) * t)
+                y = old[1] + round((y - old[1]) * t)
+            result.append((x, y))
+        return result
+
+    # Дальше — только в потоке клиента
+    async def run(self):
+        if self.serve:
+            self.server = GhostServer(self.host, self.port)
+            try:
+                await self.server.start()
+            except OSError:
+                self.server = None
+                pass  # порт занят — вероятно, сервер уже запущен, подключаемся к нему
+        warned = False
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                if not warned: print(f"Warning: Could not connect to ghost server {self.host}:{self.port}: {e}")
+                warned = True
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            warned = False
+            self.writer = writer
+            if self.level_name is not None: self._join(self.level_name)
+            try:
+                while True:
+                    self._receive(await read_message(reader))
+            except (asyncio.IncompleteReadError, ConnectionError, ValueError, IndexError, struct.error):
+                pass
+            finally:
+                self.writer = None
+                writer.close()
+                self._reset()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def _reset(self):
+        self.known = {}
+        self.awaiting_keyframe = True
+        self.last_sent = None
+        with self.lock:
+            self.frames.clear()
+            self.clock_offset = None
+
+    def _join(self, level_name):
+        self.level_name = level_name
+        if self.writer is None: return
+        self._reset()
+        self.writer.write(join_message(level_name))
+
+    def _leave(self):
+        self.level_name = None
+        if self.writer is None: return
+        self._reset()
+        self.writer.write(frame(bytes((MSG_LEAVE,))))
+
+    def _publish(self, state):
+        if self.writer is None or self.level_name is None: return
+        record = encode_record(self.last_sent, state)
+        if record == UNCHANGED_RECORD: return
+        self.writer.write(state_message(record))
+        self.last_sent = state
+
+    def _receive(self, message):
+        kind = message[0]
+        if kind == MSG_WELCOME:
+            self.player = _WELCOME.unpack(message)[1]
+            return
+        if kind != MSG_SNAPSHOT: return
+        _, flags, seq, count = _SNAPSHOT.unpack_from(message)
+        if flags & SNAPSHOT_KEYFRAME:
+            known = {}
+            self.awaiting_keyframe = False
+        elif self.awaiting_keyframe:
+            return
+        else:
+            known = self.known
+        offset = _SNAPSHOT.size
+        for _ in range(count):
+            (player,) = _ID.unpack_from(message, offset)
+            offset += _ID.size
+            prev = known.get(player)
+            if prev is None and not message[offset] & (F_ABSOLUTE | F_GONE):
+                # Дельта к неизвестному состоянию: игрок появится со следующей абсолютной записью
+                offset += record_size(message[offset])
+                continue
+            state, offset = decode_record(message, offset, prev)
+            if state is None:
+                known.pop(player, None)
+            else:
+                known[player] = state
+        self.known = known
+        server_time = seq / FPS
+        positions = {player: state[:2] for player, state in known.items() if player != self.player}
+        offset = time.monotonic() - server_time
+        with self.lock:
+            if self.clock_offset is None or offset < self.clock_offset: self.clock_offset = offset
+            self.frames.append((server_time, positions))
+
+
+# --- Запуск без окна: сервер и боты для проверки ---
+async def serve(host, port, stats_interval=10.0):
+    server = GhostServer(host, port)
+    await server.start()
+    print(f"Сервер призраков на {host}:{port}")
+    sent = 0
+    while True:
+        await asyncio.sleep(stats_interval)
+        print(f"клиентов {server.client_count}, комнат {len(server.rooms)}, "
+              f"отправлено {(server.bytes_sent - sent) / stats_interval / 1024:.1f} КБ/с")
+        sent = server.bytes_sent
+
+
+async def run_bots(host, port, count, level_name, driver_name='autopilot', seconds=None, stats_interval=10.0):
+    """count машин на GameEngine с автопилотом, каждая — отдельное подключение, как у настоящих автоматов."""
+    from simulate import DRIVERS
+    player_size, enemy_sizes = sprite_sizes()
+    bots = []
+    received = [0]
+
+    async def drain(reader):
+        try:
+            while True:
+                message = await read_message(reader)
+                received[0] += _LENGTH.size + len(message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    for seed in range(count):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(join_message(level_name))
+        asyncio.get_running_loop().create_task(drain(reader))
+        engine = GameEngine(level_name, player_size, enemy_sizes, seed=seed)
+        bots.append([engine, DRIVERS[driver_name](seed), writer, None, seed])
+
+    loop = asyncio.get_running_loop()
+    started = deadline = loop.time()
+    last_stats, last_received = started, 0
+    while seconds is None or loop.time() - started < seconds:
+        for bot in bots:
+            engine, drive, writer, last_sent, seed = bot
+            if not engine.step(drive(engine)):
+                # После аварии бот сразу начинает новую партию на следующем зерне
+                bot[4] = seed = seed + count
+                engine.reset(seed)
+            state = quantize(engine.player_x, engine.player_y, engine.player_vertical_speed, engine.score)
+            record = encode_record(last_sent, state)
+            if record != UNCHANGED_RECORD:
+                writer.write(state_message(record))
+                bot[3] = state
+        deadline += 1 / FPS
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+        if loop.time() - last_stats >= stats_interval:
+            print(f"ботов {count}, получено {(received[0] - last_received) / (loop.time() - last_stats) / 1024 / count:.1f} "
+                  f"КБ/с на бота")
+            last_stats, last_received = loop.time(), received[0]
+    for bot in bots: bot[2].close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сервер призраков 2D Traffic Racer")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('serve', "запустить сервер"), ('bots', "подключить машины с автопилотом")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('--host', default=DEFAULT_HOST)
+        command.add_argument('--port', type=int, default=DEFAULT_PORT)
+        command.add_argument('--stats', type=float, default=10.0, help="период вывода статистики, с")
+    bots_parser = commands.choices['bots']
+    bots_parser.add_argument('--count', type=int, default=10)
+    bots_parser.add_argument('--level', choices=LEVEL_SETTINGS, default='Средний')
+    bots_parser.add_argument('--driver', default='autopilot')
+    bots_parser.add_argument('--seconds', type=float, help="сколько ездить (по умолчанию до Ctrl+C)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'serve':
+            asyncio.run(serve(args.host, args.port, args.stats))
+        else:
+            asyncio.run(run_bots(args.host, args.port, args.count, args.level, args.driver, args.seconds, args.stats))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"ОШИБКА {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
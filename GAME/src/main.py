@@ -1,75 +1,129 @@
-import sys
-import random
-import os
-import json
-
-# --- Безопасный импорт мультимедиа-компонентов для предотвращения сбоев ---
-try:
-    from PyQt6.QtMultimedia import QSoundEffect
-    from PyQt6.QtCore import QUrl
-
-    sound_class = QSoundEffect
-    sound_url_class = QUrl
-    sound_enabled = True
-    print("PyQt6-Multimedia загружен успешно. Звук включен.")
-except (ImportError, ModuleNotFoundError):
-    print("ПРЕДУПРЕЖДЕНИЕ: PyQt6-Multimedia не найден или вызвал ошибку. Запуск без звука.")
-
-
-    class DummySound:
-        def __init__(self, *args, **kwargs): pass
-
-        def setSource(self, *args, **kwargs): pass
-
-        def setLoopCount(self, *args, **kwargs): pass
+import time
 
-        def setVolume(self, *args, **kwargs): pass
+PROCESS_STARTED = time.perf_counter()
 
-        def play(self, *args, **kwargs): pass
-
-        def stop(self, *args, **kwargs): pass
-
-        def isPlaying(self, *args, **kwargs): return False
-
-
-    sound_class = DummySound
-    sound_url_class = None
-    sound_enabled = False
+import sys
+import os
+import getpass
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QPushButton, QLabel, QStackedWidget, QSlider, QComboBox, QGridLayout)
-from PyQt6.QtGui import QPainter, QColor, QPixmap, QFont
-from PyQt6.QtCore import Qt, QTimer, QRect, pyqtSignal, QSize
-
-# --- Глобальные константы ---
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 700
-FPS = 60
-HIGHSCORE_FILE = 'highscores.json'
-
-# --- Настройки ---
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+from PyQt6 import sip
+from PyQt6.QtGui import QPainter, QColor, QFont, QFontMetrics, QPixmap, QBrush, QPalette, QStaticText
+from PyQt6.QtCore import Qt, QTimer, QElapsedTimer, QRect, QEvent, pyqtSignal
 
-LEVEL_SETTINGS = {
-    'Легкий': {'enemy_speed_min': 4, 'enemy_speed_max': 7, 'spawn_rate': 70},
-    'Средний': {'enemy_speed_min': 6, 'enemy_speed_max': 10, 'spawn_rate': 50},
-    'Сложный': {'enemy_speed_min': 9, 'enemy_speed_max': 14, 'spawn_rate': 30}
-}
+PYQT_IMPORTED = time.perf_counter()
 
-GRAPHICS_SETTINGS = {'Низкое': 0.8, 'Среднее': 1.0, 'Высокое': 1.2}
+from assets import ASSET_CACHE
+from engine import (SCREEN_WIDTH, SCREEN_HEIGHT, FPS, BASE_DIR, PLAYABLE_LEVELS, GRAPHICS_SETTINGS, PLAYER_CAR_IMAGE,
+                    ENEMY_CAR_IMAGES, CAR_BASE_SIZE, ROAD_SCROLL_SPEED, INPUT_UP, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT,
+                    GameEngine, new_seed)
+from profiler import (PROFILE_ENV, TRACE_DIR_NAME, OVERLAY_SIZE, SECTION_UPDATE, SECTION_PAINT, SECTION_HUD,
+                      SECTION_SOUND, FrameProfiler)
+from replay import REPLAY_DIR, Recorder
+from score_store import MAX_HIGHSCORES, open_score_store
+from traffic import TRAFFIC_ENV, TRAFFIC_LOOP_ENV, TrafficError, TrafficSchedule, ScheduleSource
+from sound import SoundManager
 
+GAME_MODULES_IMPORTED = time.perf_counter()
 
-# --- Вспомогательные классы ---
-class Enemy:
-    def __init__(self, image, level_conf):
-        self.image = image
-        self.rect = QRect(
-            random.randint(120, SCREEN_WIDTH - 120 - self.image.width()),
-            random.randint(-300, -150),
-            self.image.width(),
-            self.image.height()
-        )
-        self.speed_offset = random.uniform(level_conf['enemy_speed_min'], level_conf['enemy_speed_max'])
+# --- Глобальные константы ---
+PLAYER_ENV = 'PYGAME_PLAYER'  # имя игрока в результатах; по умолчанию пользователь ОС
+GHOSTS_ENV = 'PYGAME_GHOSTS'  # адрес сервера призраков host:port или local (см. ghosts.py)
+
+# --- Игровой цикл с фиксированным шагом ---
+# Симуляция всегда идёт шагами по 1/FPS секунды, отрисовка — как позволяет режим:
+# 'fixed' — таймер с частотой FPS, 'uncapped' — так часто, как успевает цикл событий,
+# 'vsync' — по QWindow.requestUpdate: платформа присылает UpdateRequest к обновлению экрана
+# (Wayland, macOS и т. п.), а где не умеет — не чаще раза в QT_QPA_UPDATE_IDLE_TIME мс (5 по умолчанию)
+FRAME_MODE = os.environ.get('PYGAME_FRAME_MODE', 'fixed')
+STEP_NS = 1_000_000_000 // FPS
+MAX_CATCHUP_STEPS = 5  # больше шагов за кадр не догоняем, иначе медленный кадр тянет за собой следующий
+MAX_FRAME_NS = STEP_NS * MAX_CATCHUP_STEPS
+
+HUD_SIZE = (210, 100)
+HUD_LINES = (("Скорость: ", 5), ("Рекорд: ", 35), ("Очки: ", 65))  # подпись и отступ строки от верха панели
+PEDAL_ICON_SIZE = 64
+ATLAS_PADDING = 1  # прозрачный зазор между спрайтами атласа, чтобы сглаживание не цепляло соседа
+# QPainter.PixmapFragment — 10 double: x, y, sourceLeft, sourceTop, width, height, scaleX, scaleY, rotation, opacity
+FRAGMENT_FIELDS = 10
+GHOST_OPACITY = 0.4
+
+# Изображения игрового экрана: (путь, базовый размер)
+ROAD_IMAGE = os.path.join('assets', 'images', 'road.png')
+GAS_PEDAL_IMAGE = os.path.join('assets', 'images', 'arrow_up.png')
+BRAKE_PEDAL_IMAGE = os.path.join('assets', 'images', 'arrow_down.png')
+# Порядок машин — как в атласе: соперники, последним игрок
+CAR_ASSETS = [(path, CAR_BASE_SIZE) for path in ENEMY_CAR_IMAGES] + [(PLAYER_CAR_IMAGE, CAR_BASE_SIZE)]
+GAME_ASSETS = CAR_ASSETS + [(ROAD_IMAGE, (SCREEN_WIDTH, SCREEN_HEIGHT)), (GAS_PEDAL_IMAGE, (64, 64)),
+                            (BRAKE_PEDAL_IMAGE, (64, 64))]
+
+# --- Автоматическое качество графики ---
+# В режиме 'Авто' размеры машин для столкновений, дорога и иконки остаются как у AUTO_BASE_GRAPHICS,
+# а спрайты машин на ходу меняются между уровнями GRAPHICS_TIERS по времени работы кадра.
+# Спрайты любого уровня заранее приводятся к размеру машин, поэтому цену кадра задаёт не их
+# разрешение, а то, как рисуется движение между тиками (AUTO_TIER_MOTION)
+AUTO_GRAPHICS = 'Авто'
+AUTO_BASE_GRAPHICS = 'Среднее'
+GRAPHICS_TIERS = tuple(GRAPHICS_SETTINGS)  # от низкого к высокому
+AUTO_WINDOW_FRAMES = 60  # кадров в одном окне усреднения
+AUTO_DOWNGRADE_LOAD = 0.75  # доля бюджета кадра (STEP_NS), выше которой качество понижается
+AUTO_UPGRADE_LOAD = 0.35  # и ниже которой повышается; зазор между порогами не даёт качеству качаться
+AUTO_UPGRADE_WINDOWS = 3  # повышение — только после стольких спокойных окон подряд
+# Машины на месте последнего тика; с интерполяцией до целого пикселя (как в ручных режимах);
+# с интерполяцией до долей пикселя и сглаживанием — заметно дороже
+CAR_MOTION_TICK, CAR_MOTION_INTERPOLATED, CAR_MOTION_SUBPIXEL = range(3)
+AUTO_TIER_MOTION = (CAR_MOTION_TICK, CAR_MOTION_INTERPOLATED, CAR_MOTION_SUBPIXEL)  # по GRAPHICS_TIERS
+
+# PYGAME_STARTUP_PROFILE=1 печатает, на что ушло время запуска; =exit ещё и закрывает игру после прогрева
+STARTUP_PROFILE_ENV = 'PYGAME_STARTUP_PROFILE'
+
+# Клавиши управления и соответствующие им биты маски ввода движка
+KEY_INPUTS = ((Qt.Key.Key_Up, INPUT_UP), (Qt.Key.Key_Down, INPUT_DOWN),
+              (Qt.Key.Key_Left, INPUT_LEFT), (Qt.Key.Key_Right, INPUT_RIGHT))
+
+
+def graphics_quality(setting):
+    """Множитель качества для настройки графики; у 'Авто' — множитель базового уровня."""
+    return GRAPHICS_SETTINGS[AUTO_BASE_GRAPHICS if setting == AUTO_GRAPHICS else setting]
+
+
+class QualityGovernor:
+    """Выбирает уровень GRAPHICS_TIERS по среднему времени работы кадра (симуляция и отрисовка) за окно."""
+
+    def __init__(self, tier):
+        self.tier = tier
+        self.reset()
+
+    def reset(self):
+        self.work_ns = 0
+        self.frames = 0
+        self.calm_windows = 0
+        # Первое окно после старта или смены уровня не в счёт: в нём прогрев и сборка атласа
+        self.settling = True
+
+    def add_frame(self, work_ns):
+        """Учитывает кадр; возвращает новый уровень, если его пора сменить, иначе None."""
+        self.work_ns += work_ns
+        self.frames += 1
+        if self.frames < AUTO_WINDOW_FRAMES: return None
+        load = self.work_ns / self.frames / STEP_NS
+        self.work_ns = self.frames = 0
+        if self.settling:
+            self.settling = False
+            return None
+        if load > AUTO_DOWNGRADE_LOAD and self.tier > 0:
+            self.tier -= 1
+        elif load < AUTO_UPGRADE_LOAD and self.tier < len(GRAPHICS_TIERS) - 1:
+            self.calm_windows += 1
+            if self.calm_windows < AUTO_UPGRADE_WINDOWS: return None
+            self.tier += 1
+        else:
+            self.calm_windows = 0
+            return None
+        self.calm_windows = 0
+        self.settling = True
+        return self.tier
 
 
 class GameWidget(QWidget):
@@ -79,208 +133,468 @@ class GameWidget(QWidget):
         super().__init__()
         self.settings_manager = settings_manager
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        # Дорога каждый кадр закрывает весь экран, стирать фон перед отрисовкой незачем
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+        self.car_fragments, self.car_fragment_view = self.fragment_array(0)
+        self.ghost_fragments, self.ghost_fragment_view = self.fragment_array(0, GHOST_OPACITY)
         self.load_assets()
-        self.init_sounds()
+        # Эффекты создаются уже после запуска цикла событий, чтобы не задерживать первый кадр меню
+        self.sounds = SoundManager(self)
+        QTimer.singleShot(0, self.sounds.load)
+        self.init_hud()
         self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_game)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.advance_frame)
+        self.clock = QElapsedTimer()
+        self.accumulator_ns = 0
+        self.last_frame_ns = 0
+        self.frame_alpha = 0.0
         self.keys_pressed = set()
+        self.frame_work_ns = 0
+        self.profiler = FrameProfiler() if os.environ.get(PROFILE_ENV) else None
+        self.frame_window = None  # окно, чьи UpdateRequest задают темп в режиме 'vsync'
+        # Общее для всех партий расписание движения (турниры, бесконечные заезды)
+        self.traffic_schedule = None
+        traffic_path = os.environ.get(TRAFFIC_ENV)
+        if traffic_path:
+            try:
+                self.traffic_schedule = TrafficSchedule(traffic_path)
+            except (OSError, TrafficError) as e:
+                print(f"Warning: Could not open traffic schedule {traffic_path}: {e}")
+        # Призраки других автоматов; asyncio импортируется, только если они включены
+        self.ghosts = None
+        ghosts_address = os.environ.get(GHOSTS_ENV)
+        if ghosts_address:
+            from ghosts import GhostClient
+            try:
+                self.ghosts = GhostClient.from_address(ghosts_address)
+            except ValueError as e:
+                print(f"Warning: Invalid ghost server address {ghosts_address}: {e}")
 
     def load_pixmap(self, path, base_size):
-        quality_multiplier = GRAPHICS_SETTINGS[self.settings_manager.get_setting('graphics')]
-        size = (int(base_size[0] * quality_multiplier), int(base_size[1] * quality_multiplier))
-        full_path = os.path.join(BASE_DIR, path)
-        if os.path.exists(full_path):
-            pixmap = QPixmap(full_path)
-            return pixmap.scaled(QSize(*size), Qt.AspectRatioMode.KeepAspectRatio,
-                                 Qt.TransformationMode.SmoothTransformation)
-        else:
-            print(f"Warning: Asset not found at {full_path}. Using fallback color.")
-            pixmap = QPixmap(QSize(*size));
-            pixmap.fill(QColor("purple"));
-            return pixmap
+        return ASSET_CACHE.pixmap(path, base_size, self.assets_quality)
 
     def load_assets(self):
-        self.player_image = self.load_pixmap(os.path.join('assets', 'images', 'player_car.png'), (50, 100))
-        self.enemy_images = [
-            self.load_pixmap(os.path.join('assets', 'images', 'enemy_car_1.png'), (50, 100)),
-            self.load_pixmap(os.path.join('assets', 'images', 'enemy_car_2.png'), (50, 100))
-        ]
-        self.road_image = self.load_pixmap(os.path.join('assets', 'images', 'road.png'), (SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.gas_pedal_icon = self.load_pixmap(os.path.join('assets', 'images', 'arrow_up.png'), (64, 64))
-        self.brake_pedal_icon = self.load_pixmap(os.path.join('assets', 'images', 'arrow_down.png'), (64, 64))
-
-    def init_sounds(self):
-        self.sounds = {}
-        if not sound_enabled:
-            return
-
-        sound_files = {
-            'gas': os.path.join('assets', 'sounds', 'gas.wav'), 'brake': os.path.join('assets', 'sounds', 'brake.wav'),
-            'honk': os.path.join('assets', 'sounds', 'honk.wav'), 'crash': os.path.join('assets', 'sounds', 'crash.wav')
-        }
-        for name, path in sound_files.items():
-            full_path = os.path.join(BASE_DIR, path)
-            if os.path.exists(full_path):
-                sound = sound_class(self)
-                sound.setSource(sound_url_class.fromLocalFile(full_path))
-                self.sounds[name] = sound
-            else:
-                print(f"Warning: Sound not found at {full_path}");
-                self.sounds[name] = None
-
-        if self.sounds.get('gas'):
-            # --- ОКОНЧАТЕЛЬНОЕ ИСПРАВЛЕНИЕ ---
-            # Используем напрямую число -2 для бесконечного повтора
-            self.sounds['gas'].setLoopCount(-2)
-
-    def play_sound(self, name, stop=False):
-        sound = self.sounds.get(name)
-        if sound:
-            volume = self.settings_manager.get_setting('sound_volume') / 100.0
-            sound.setVolume(volume)
-            if stop:
-                sound.stop()
-            elif not sound.isPlaying():
-                sound.play()
+        self.graphics_setting = self.settings_manager.get_setting('graphics')
+        self.assets_quality = graphics_quality(self.graphics_setting)
+        auto = self.graphics_setting == AUTO_GRAPHICS
+        # 'Авто' держит в кэше спрайты всех уровней, чтобы менять их без чтения с диска
+        ASSET_CACHE.set_quality(*(GRAPHICS_SETTINGS.values() if auto else (self.assets_quality,)))
+        self.player_image = self.load_pixmap(PLAYER_CAR_IMAGE, CAR_BASE_SIZE)
+        self.enemy_images = [self.load_pixmap(path, CAR_BASE_SIZE) for path in ENEMY_CAR_IMAGES]
+        self.road_image = self.load_pixmap(ROAD_IMAGE, (SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.gas_pedal_icon = self.load_pixmap(GAS_PEDAL_IMAGE, (64, 64))
+        self.brake_pedal_icon = self.load_pixmap(BRAKE_PEDAL_IMAGE, (64, 64))
+        self.gas_pedal_icons = self.bake_pedal_icons(self.gas_pedal_icon)
+        self.brake_pedal_icons = self.bake_pedal_icons(self.brake_pedal_icon)
+        self.road_tile = None
+        self.road_tile_size = None
+        self.car_sizes = [(image.width(), image.height()) for image in self.enemy_images + [self.player_image]]
+        self.car_motion = CAR_MOTION_INTERPOLATED
+        self.quality_governor = QualityGovernor(GRAPHICS_TIERS.index(AUTO_BASE_GRAPHICS)) if auto else None
+        self.set_car_quality(self.assets_quality)
+
+    def set_car_quality(self, quality):
+        """Собирает атлас из спрайтов машин качества quality. Размеры машин в игре (хитбоксы) остаются
+        по player_image и enemy_images; спрайты другого качества берутся уже приведёнными к ним."""
+        self.car_quality = quality
+        if quality == self.assets_quality:
+            images = self.enemy_images + [self.player_image]
+        else:
+            images = [ASSET_CACHE.pixmap(path, base_size, quality, size)
+                      for (path, base_size), size in zip(CAR_ASSETS, self.car_sizes)]
+        self.car_atlas, self.car_sources = self.bake_car_atlas(images)
+
+    def set_quality_tier(self, tier):
+        """Переключение 'Авто': спрайты нового уровня уже подготовлены в фоне, соседние начинают готовиться."""
+        self.set_car_quality(GRAPHICS_SETTINGS[GRAPHICS_TIERS[tier]])
+        self.car_motion = AUTO_TIER_MOTION[tier]
+        for neighbour in (tier - 1, tier + 1):
+            if not 0 <= neighbour < len(GRAPHICS_TIERS): continue
+            quality = GRAPHICS_SETTINGS[GRAPHICS_TIERS[neighbour]]
+            # Спрайты базового уровня — это и есть player_image и enemy_images
+            if quality != self.assets_quality: ASSET_CACHE.prefetch(CAR_ASSETS, quality, self.car_sizes)
+
+    @staticmethod
+    def bake_pedal_icons(icon):
+        """Возвращает (отпущена, нажата): иконку 64x64 с непрозрачностью 50% и 100%."""
+        variants = []
+        for opacity in (0.5, 1.0):
+            pixmap = QPixmap(PEDAL_ICON_SIZE, PEDAL_ICON_SIZE)
+            pixmap.fill(Qt.GlobalColor.transparent)
+            painter = QPainter(pixmap)
+            painter.setOpacity(opacity)
+            painter.drawPixmap(QRect(0, 0, PEDAL_ICON_SIZE, PEDAL_ICON_SIZE), icon)
+            painter.end()
+            variants.append(pixmap)
+        return tuple(variants)
+
+    @staticmethod
+    def bake_car_atlas(images):
+        """Склеивает спрайты в одну строку. Возвращает атлас и для каждого спрайта
+        (left в атласе, смещение центра спрайта от его угла по x и y, ширина, высота)."""
+        width = sum(image.width() + ATLAS_PADDING for image in images)
+        atlas = QPixmap(width, max(image.height() for image in images))
+        atlas.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(atlas)
+        sources = []
+        left = 0
+        for image in images:
+            painter.drawPixmap(left, 0, image)
+            w, h = image.width(), image.height()
+            sources.append((float(left), w / 2, h / 2, float(w), float(h)))
+            left += w + ATLAS_PADDING
+        painter.end()
+        return atlas, sources
+
+    def bake_road_tile(self):
+        """Дорога, уложенная дважды друг над другом: прокрутка — одно копирование окна высотой с экран."""
+        width, height = self.width(), self.height()
+        tile = QPixmap(width, height * 2)
+        tile.fill(self.palette().color(QPalette.ColorRole.Window))
+        painter = QPainter(tile)
+        # Порядок как у прежних двух копий: если дорога выше экрана, верхняя перекрывает нижнюю
+        painter.drawPixmap(0, height, self.road_image)
+        painter.drawPixmap(0, 0, self.road_image)
+        painter.end()
+        self.road_tile = tile
+        self.road_tile_size = (width, height)
+
+    @staticmethod
+    def fragment_array(size, opacity=1.0):
+        """Массив фрагментов для drawPixmapFragments и его поля как double; неизменные поля заполнены сразу."""
+        fragments = sip.array(QPainter.PixmapFragment, size)
+        view = memoryview(fragments).cast('d')
+        for i in range(0, len(view), FRAGMENT_FIELDS):
+            # sourceTop, scaleX, scaleY, rotation, opacity
+            view[i + 3], view[i + 6], view[i + 7], view[i + 8], view[i + 9] = 0.0, 1.0, 1.0, 0.0, opacity
+        return fragments, view
+
+    def ensure_car_fragments(self, count):
+        if len(self.car_fragments) < count:
+            self.car_fragments, self.car_fragment_view = self.fragment_array(max(count, 2 * len(self.car_fragments)))
 
     def start_game(self, level_name):
-        self.load_assets();
+        # Изображения берутся из кэша; заново они готовятся только после смены качества графики
+        if self.graphics_setting != self.settings_manager.get_setting('graphics'): self.load_assets()
+        if self.quality_governor is not None:
+            self.quality_governor.reset()
+            self.set_quality_tier(self.quality_governor.tier)
         self.level_name = level_name
-        self.current_level_settings = LEVEL_SETTINGS[level_name]
-        self.game_running = True;
-        self.score = 0
-
-        self.player_vertical_speed = 0;
-        self.acceleration = 0.5
-        self.braking = 0.5;
-        self.natural_deceleration = 0.98
-        self.max_player_speed = 15;
-        self.road_scroll_speed = 5
-
-        self.player_rect = QRect((self.width() - self.player_image.width()) // 2,
-                                 self.height() - self.player_image.height() - 20, self.player_image.width(),
-                                 self.player_image.height())
-        self.player_side_speed = 8;
-        self.enemies = [];
-        self.enemy_timer = 0;
-        self.road_offset_y = 0
+        enemy_sizes = [(image.width(), image.height()) for image in self.enemy_images]
+        spawn_source = self.traffic_source(level_name, enemy_sizes)
+        self.engine = GameEngine(level_name, (self.player_image.width(), self.player_image.height()),
+                                 enemy_sizes, self.width(), self.height(),
+                                 auto_accel=self.settings_manager.get_setting('accel_mode') != 'Педаль',
+                                 seed=self.traffic_schedule.seed if spawn_source is not None else new_seed(),
+                                 spawn_source=spawn_source)
+        self.recorder = Recorder(self.engine)
+        # Таблица рекордов уровня читается сейчас, а не в момент аварии
+        self.settings_manager.level_top(level_name)
+        if self.ghosts is not None: self.ghosts.join(level_name)
+        self.sounds.set_volume(self.settings_manager.get_setting('sound_volume'))
+        self.game_running = True
         self.keys_pressed.clear();
-        self.timer.start(1000 // FPS);
+        self.accumulator_ns = 0
+        self.frame_alpha = 0.0
+        self.clock.start()
+        self.last_frame_ns = 0
+        if FRAME_MODE == 'vsync':
+            self.request_frame()
+        else:
+            self.timer.start(0 if FRAME_MODE == 'uncapped' else 1000 // FPS)
         self.setFocus()
 
+    def traffic_source(self, level_name, enemy_sizes):
+        """Машины по расписанию, если оно рассчитано на этот уровень, размеры машин и поля; иначе None."""
+        schedule = self.traffic_schedule
+        if schedule is None: return None
+        if (schedule.level_name, schedule.enemy_sizes, schedule.width, schedule.height) != (
+                level_name, tuple(enemy_sizes), self.width(), self.height()):
+            print(f"Warning: Traffic schedule {schedule.path} does not match level {level_name} or car sizes, "
+                  f"using random traffic")
+            return None
+        # Запись партии ссылается на расписание, и replay.py verify проигрывает её по нему же.
+        # Без PYGAME_TRAFFIC_LOOP заезд заканчивается вместе с расписанием
+        return ScheduleSource(schedule, loop=bool(os.environ.get(TRAFFIC_LOOP_ENV)))
+
+    @property
+    def score(self):
+        return self.engine.score
+
+    def input_mask(self):
+        mask = 0
+        for key, bit in KEY_INPUTS:
+            if key in self.keys_pressed: mask |= bit
+        return mask
+
     def keyPressEvent(self, event):
         if not event.isAutoRepeat():
             self.keys_pressed.add(event.key())
-            if event.key() == Qt.Key.Key_Space: self.play_sound('honk')
+            if event.key() == Qt.Key.Key_Space: self.sounds.play('honk')
+            # В стресс-режиме столкновения не заканчивают игру, выйти из неё можно по Esc
+            if event.key() == Qt.Key.Key_Escape and self.game_running: self.end_game()
+            if event.key() == Qt.Key.Key_F3: self.toggle_profiler()
+            if event.key() == Qt.Key.Key_F4 and self.profiler is not None:
+                path = self.profiler.dump_chrome_trace(os.path.join(BASE_DIR, TRACE_DIR_NAME))
+                print(f"Профиль кадров сохранён: {path}")
 
     def keyReleaseEvent(self, event):
         if not event.isAutoRepeat(): self.keys_pressed.discard(event.key())
 
-    def update_game(self):
-        if not self.game_running: return
-
-        is_accelerating = False;
-        is_braking = False
-
-        if self.settings_manager.get_setting('accel_mode') == 'Педаль':
-            if Qt.Key.Key_Up in self.keys_pressed:
-                self.player_vertical_speed -= self.acceleration; is_accelerating = True
-            elif Qt.Key.Key_Down in self.keys_pressed:
-                self.player_vertical_speed += self.braking; is_braking = True
+    def toggle_profiler(self):
+        if self.profiler is None:
+            self.profiler = FrameProfiler()
         else:
-            self.player_vertical_speed = -5
+            self.profiler.close()
+            self.profiler = None
+        self.update()
 
-        if not is_accelerating and not is_braking:
-            self.player_vertical_speed *= self.natural_deceleration
-            if abs(self.player_vertical_speed) < 0.1: self.player_vertical_speed = 0
+    def request_frame(self):
+        """Режим 'vsync': следующий кадр — по UpdateRequest окна, который ловит eventFilter."""
+        window = self.window().windowHandle()
+        if window is None:  # окно ещё не создано
+            QTimer.singleShot(0, self.request_frame)
+            return
+        if window is not self.frame_window:
+            if self.frame_window is not None: self.frame_window.removeEventFilter(self)
+            self.frame_window = window
+            window.installEventFilter(self)
+        window.requestUpdate()
+
+    def eventFilter(self, watched, event):
+        # Шаги симуляции — до того, как окно по этому же событию перерисует изменившиеся виджеты
+        if watched is self.frame_window and event.type() == QEvent.Type.UpdateRequest: self.advance_frame()
+        return super().eventFilter(watched, event)
+
+    def advance_frame(self):
+        """Прогоняет столько фиксированных шагов, сколько реального времени прошло с прошлого кадра."""
+        if not self.game_running: return
+        profiler = self.profiler
+        if profiler is not None: profiler.begin_frame()
+        now_ns = self.clock.nsecsElapsed()
+        self.accumulator_ns += min(now_ns - self.last_frame_ns, MAX_FRAME_NS)
+        self.last_frame_ns = now_ns
+        steps = 0
+        while self.accumulator_ns >= STEP_NS and steps < MAX_CATCHUP_STEPS:
+            if profiler is None:
+                self.update_game()
+            else:
+                started = profiler.clock()
+                self.update_game()
+                profiler.add(SECTION_UPDATE, started, profiler.clock())
+            if not self.game_running: return
+            self.accumulator_ns -= STEP_NS
+            steps += 1
+        if self.accumulator_ns >= STEP_NS: self.accumulator_ns %= STEP_NS
+        self.frame_alpha = self.accumulator_ns / STEP_NS
+        if self.quality_governor is not None: self.frame_work_ns = self.clock.nsecsElapsed() - now_ns
+        self.update()
 
-        self.player_vertical_speed = max(-self.max_player_speed, min(self.player_vertical_speed, self.max_player_speed))
-        self.player_rect.moveTop(self.player_rect.top() + int(self.player_vertical_speed))
+    def update_game(self):
+        """Один шаг симуляции длиной 1/FPS секунды."""
+        if not self.game_running: return
+        engine = self.engine
+        inputs = self.input_mask()
+        self.recorder.record(inputs)
+        running = engine.step(inputs)
+        if self.ghosts is not None:
+            self.ghosts.publish(engine.player_x, engine.player_y, engine.player_vertical_speed, engine.score)
 
-        if self.player_rect.top() < 0: self.player_rect.moveTop(0); self.player_vertical_speed = 0
-        if self.player_rect.bottom() > self.height(): self.player_rect.moveBottom(
-            self.height()); self.player_vertical_speed = 0
+        profiler = self.profiler
+        if profiler is not None: started = profiler.clock()
+        self.sounds.set_channel('gas', engine.is_accelerating)
+        self.sounds.set_channel('brake', engine.is_braking)
+        if profiler is not None: profiler.add(SECTION_SOUND, started, profiler.clock())
 
-        if is_accelerating:
-            self.play_sound('gas');
-        else:
-            self.play_sound('gas', stop=True)
-        if is_braking:
-            self.play_sound('brake')
-        else:
-            self.play_sound('brake', stop=True)
-
-        if (Qt.Key.Key_Left in self.keys_pressed) and self.player_rect.left() > 110: self.player_rect.moveLeft(
-            self.player_rect.left() - self.player_side_speed)
-        if (
-                Qt.Key.Key_Right in self.keys_pressed) and self.player_rect.right() < self.width() - 110: self.player_rect.moveRight(
-            self.player_rect.right() + self.player_side_speed)
-
-        self.road_offset_y = (self.road_offset_y + self.road_scroll_speed) % self.height()
-        if self.player_vertical_speed < 0: self.score += 1
-
-        self.enemy_timer += 1
-        if self.enemy_timer > self.current_level_settings['spawn_rate'] and len(self.enemies) < 5:
-            self.enemy_timer = 0;
-            self.enemies.append(Enemy(random.choice(self.enemy_images), self.current_level_settings))
-
-        for enemy in self.enemies[:]:
-            enemy.rect.moveTop(enemy.rect.top() + int(enemy.speed_offset))
-            if enemy.rect.bottom() < self.player_rect.top() and not hasattr(enemy, 'overtaken'):
-                self.score += 150;
-                enemy.overtaken = True
-            if enemy.rect.top() > self.height() + 100:
-                if enemy in self.enemies: self.enemies.remove(enemy)
-            if self.player_rect.intersects(enemy.rect): self.end_game(); return
-        self.update()
+        if not running: self.end_game()
 
     def end_game(self):
         self.game_running = False;
         self.timer.stop();
-        self.play_sound('gas', stop=True)
-        self.play_sound('brake', stop=True);
-        self.play_sound('crash')
-        self.settings_manager.check_and_save_score(self.score);
+        self.sounds.stop_channels()
+        self.sounds.play('crash')
+        if self.ghosts is not None: self.ghosts.leave()
+        self.settings_manager.check_and_save_score(self.score, self.recorder.finish(self.engine));
         self.gameOver.emit(self.score)
 
     def paintEvent(self, event):
+        profiler = self.profiler
+        if profiler is not None: paint_started = profiler.clock()
+        governor = self.quality_governor
+        if governor is not None: governor_started = self.clock.nsecsElapsed()
         painter = QPainter(self)
-        painter.drawPixmap(0, self.road_offset_y, self.road_image)
-        painter.drawPixmap(0, self.road_offset_y - self.height(), self.road_image)
-        for enemy in self.enemies: painter.drawPixmap(enemy.rect, enemy.image)
-        painter.drawPixmap(self.player_rect, self.player_image)
-        self.draw_hud(painter);
+        engine = self.engine
+        # Рисуем состояние между двумя последними шагами: alpha — доля шага, накопленная с последнего тика.
+        # Без интерполяции машин дорога тоже стоит на последнем тике, иначе машины дрожали бы относительно неё
+        alpha = self.frame_alpha if self.car_motion != CAR_MOTION_TICK else 1.0
+        width, height = self.width(), self.height()
+        if self.road_tile_size != (width, height): self.bake_road_tile()
+        road_offset = int(engine.road_offset_y - ROAD_SCROLL_SPEED * (1.0 - alpha)) % height
+        painter.drawPixmap(0, 0, self.road_tile, 0, height - road_offset, width, height)
+        if self.ghosts is not None: self.draw_ghosts(painter)
+        # Машины — фрагменты атласа, их поля пишутся прямо в массив без создания объектов
+        count = engine.enemies.count
+        self.fill_car_fragments(engine, 1.0 - alpha)
+        if self.car_motion == CAR_MOTION_SUBPIXEL: painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.drawPixmapFragments(self.car_fragments[:count + 1], self.car_atlas)
+        if profiler is None:
+            self.draw_hud(painter)
+        else:
+            hud_started = profiler.clock()
+            self.draw_hud(painter)
+            profiler.add(SECTION_HUD, hud_started, profiler.clock())
+            if profiler.overlay: profiler.draw_overlay(painter, 10, height - OVERLAY_SIZE[1] - 10)
+        painter.end()
+        if profiler is not None: profiler.add(SECTION_PAINT, paint_started, profiler.clock())
+        if governor is not None and self.game_running:
+            tier = governor.add_frame(self.frame_work_ns + self.clock.nsecsElapsed() - governor_started)
+            if tier is not None: self.set_quality_tier(tier)
+        if FRAME_MODE == 'vsync' and self.game_running and self.frame_window is not None:
+            self.frame_window.requestUpdate()
+
+    def fill_car_fragments(self, engine, back):
+        """Пишет фрагменты соперников и последним — игрока; back — доля шага назад от последнего тика."""
+        pool = engine.enemies
+        count = pool.count
+        self.ensure_car_fragments(count + 1)
+        view = self.car_fragment_view
+        sources = self.car_sources
+        xs, ys, dys, sprites = pool.x, pool.y, pool.dy, pool.sprite
+        motion = self.car_motion
+        # Цикл на каждый способ движения свой: ветвление внутри стоило бы как сама разница между ними
+        if motion == CAR_MOTION_INTERPOLATED:
+            for i in range(count):
+                left, center_x, center_y, w, h = sources[sprites[i]]
+                base = i * FRAGMENT_FIELDS
+                # x, y фрагмента — центр машины
+                view[base] = xs[i] + center_x
+                view[base + 1] = ys[i] - int(dys[i] * back) + center_y
+                view[base + 2] = left
+                view[base + 4] = w
+                view[base + 5] = h
+        elif motion == CAR_MOTION_SUBPIXEL:
+            for i in range(count):
+                left, center_x, center_y, w, h = sources[sprites[i]]
+                base = i * FRAGMENT_FIELDS
+                view[base] = xs[i] + center_x
+                view[base + 1] = ys[i] - dys[i] * back + center_y
+                view[base + 2] = left
+                view[base + 4] = w
+                view[base + 5] = h
+        else:
+            for i in range(count):
+                left, center_x, center_y, w, h = sources[sprites[i]]
+                base = i * FRAGMENT_FIELDS
+                view[base] = xs[i] + center_x
+                view[base + 1] = ys[i] + center_y
+                view[base + 2] = left
+                view[base + 4] = w
+                view[base + 5] = h
+        player_x, player_y = engine.player_x, engine.player_y
+        if motion == CAR_MOTION_INTERPOLATED:
+            player_x += int((engine.prev_player_x - player_x) * back)
+            player_y += int((engine.prev_player_y - player_y) * back)
+        elif motion == CAR_MOTION_SUBPIXEL:
+            player_x += (engine.prev_player_x - player_x) * back
+            player_y += (engine.prev_player_y - player_y) * back
+        left, center_x, center_y, w, h = sources[-1]
+        base = count * FRAGMENT_FIELDS
+        view[base] = player_x + center_x
+        view[base + 1] = player_y + center_y
+        view[base + 2] = left
+        view[base + 4] = w
+        view[base + 5] = h
+
+    def draw_ghosts(self, painter):
+        """Полупрозрачные машины других игроков уровня — под соперниками и своей машиной."""
+        positions = self.ghosts.positions()
+        if not positions: return
+        if len(self.ghost_fragments) < len(positions):
+            self.ghost_fragments, self.ghost_fragment_view = self.fragment_array(len(positions), GHOST_OPACITY)
+        view = self.ghost_fragment_view
+        left, center_x, center_y, w, h = self.car_sources[-1]
+        for i, (x, y) in enumerate(positions):
+            base = i * FRAGMENT_FIELDS
+            view[base] = x + center_x
+            view[base + 1] = y + center_y
+            view[base + 2] = left
+            view[base + 4] = w
+            view[base + 5] = h
+        painter.drawPixmapFragments(self.ghost_fragments[:len(positions)], self.car_atlas)
+
+    # --- HUD: фон панели с подписями запекается один раз, в кадре рисуются только числа ---
+    # Числа — QStaticText: раскладка текста кэшируется, заново готовится только строка с новым значением
+    def init_hud(self):
+        self.hud_font = QFont("Arial", 16, QFont.Weight.Bold)
+        self.hud_pen_color = QColor("white")
+        self.hud_brush = QBrush(QColor(0, 0, 0, 150))
+        metrics = QFontMetrics(self.hud_font)
+        # Значение каждой строки начинается сразу за её подписью
+        self.hud_value_x = [10 + metrics.horizontalAdvance(label) for label, _ in HUD_LINES]
+        self.hud_panel = None
+        self.hud_panel_ratio = None
+        self.hud_values = [None] * len(HUD_LINES)
+        self.hud_texts = [None] * len(HUD_LINES)
+
+    def render_hud_panel(self, ratio):
+        # Рамка пером 1px занимает на пиксель больше самого прямоугольника
+        pixmap = QPixmap(int((HUD_SIZE[0] + 1) * ratio), int((HUD_SIZE[1] + 1) * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pixmap)
+        painter.setPen(self.hud_pen_color)
+        painter.setFont(self.hud_font)
+        painter.setBrush(self.hud_brush)
+        painter.drawRect(0, 0, *HUD_SIZE)
+        align = Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft
+        for label, top in HUD_LINES:
+            painter.drawText(QRect(10, top, HUD_SIZE[0], HUD_SIZE[1] - top), align, label)
         painter.end()
+        self.hud_panel = pixmap
+        self.hud_panel_ratio = ratio
 
     def draw_hud(self, painter):
-        painter.setPen(QColor("white"));
-        painter.setFont(QFont("Arial", 16, QFont.Weight.Bold))
-        hud_bg_rect = QRect(self.width() - 220, 10, 210, 100)
-        painter.setBrush(QColor(0, 0, 0, 150));
-        painter.drawRect(hud_bg_rect)
-        speed_kmh = abs(self.player_vertical_speed * 10)
-        scores = self.settings_manager.load_highscores();
-        top_score = scores[0]['score'] if scores else 0
-        painter.drawText(hud_bg_rect.adjusted(10, 5, 0, 0), Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft,
-                         f"Скорость: {speed_kmh:.0f} км/ч")
-        painter.drawText(hud_bg_rect.adjusted(10, 35, 0, 0), Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft,
-                         f"Рекорд: {top_score}")
-        painter.drawText(hud_bg_rect.adjusted(10, 65, 0, 0), Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft,
-                         f"Очки: {self.score}")
-        if self.settings_manager.get_setting('accel_mode') == 'Педаль':
-            gas_rect = QRect(self.width() - 80, self.height() - 160, 64, 64)
-            painter.setOpacity(0.5 if Qt.Key.Key_Up not in self.keys_pressed else 1.0);
-            painter.drawPixmap(gas_rect, self.gas_pedal_icon)
-            brake_rect = QRect(self.width() - 80, self.height() - 80, 64, 64)
-            painter.setOpacity(0.5 if Qt.Key.Key_Down not in self.keys_pressed else 1.0);
-            painter.drawPixmap(brake_rect, self.brake_pedal_icon)
-            painter.setOpacity(1.0)
+        engine = self.engine
+        ratio = self.devicePixelRatioF()
+        if ratio != self.hud_panel_ratio: self.render_hud_panel(ratio)
+        width = self.width()
+        left = width - 220
+        painter.drawPixmap(left, 10, self.hud_panel)
+        values = (f"{round(abs(engine.player_vertical_speed * 10))} км/ч",
+                  self.settings_manager.get_top_score(engine.level_name), engine.score)
+        painter.setPen(self.hud_pen_color)
+        painter.setFont(self.hud_font)
+        texts = self.hud_texts
+        for i, value in enumerate(values):
+            if value != self.hud_values[i]:
+                texts[i] = QStaticText(str(value))
+                self.hud_values[i] = value
+            painter.drawStaticText(left + self.hud_value_x[i], 10 + HUD_LINES[i][1], texts[i])
+        if not engine.auto_accel:
+            # Полупрозрачные варианты иконок заготовлены заранее, setOpacity в кадре не нужен
+            height = self.height()
+            painter.drawPixmap(width - 80, height - 160, self.gas_pedal_icons[Qt.Key.Key_Up in self.keys_pressed])
+            painter.drawPixmap(width - 80, height - 80, self.brake_pedal_icons[Qt.Key.Key_Down in self.keys_pressed])
 
 
 # --- Остальные классы (SettingsManager, Menus, MainWindow) остаются без изменений ---
 class SettingsManager:
-    def __init__(self):
+    def __init__(self, score_store=None, replay_dir=REPLAY_DIR):
         self.settings = {'sound_volume': 50, 'graphics': 'Среднее', 'accel_mode': 'Педаль'}
+        self.scores = score_store or open_score_store()
+        self.replay_dir = replay_dir
+        # уровень -> лучшие MAX_HIGHSCORES счетов по убыванию: HUD спрашивает рекорд каждый кадр,
+        # а при аварии по ним решается, сохранять ли запись партии, — без запроса к базе в GUI-потоке
+        self.top_scores = {}
+        self.player = os.environ.get(PLAYER_ENV) or self.system_user()
+
+    @staticmethod
+    def system_user():
+        try:
+            return getpass.getuser()
+        except (OSError, KeyError):
+            return ''
 
     def get_setting(self, key):
         return self.settings.get(key)
@@ -288,21 +602,54 @@ class SettingsManager:
     def set_setting(self, key, value):
         self.settings[key] = value
 
-    def load_highscores(self):
-        try:
-            with open(os.path.join(BASE_DIR, HIGHSCORE_FILE), 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-
-    def save_highscores(self, scores):
-        with open(os.path.join(BASE_DIR, HIGHSCORE_FILE), 'w') as f: json.dump(scores, f, indent=4)
-
-    def check_and_save_score(self, score):
-        scores = self.load_highscores();
-        scores.append({'score': score})
-        scores = sorted(scores, key=lambda x: x['score'], reverse=True);
-        self.save_highscores(scores[:10])
+    # --- Результаты заездов ---
+    def load_highscores(self, level_name=None):
+        return self.scores.top(level_name, MAX_HIGHSCORES)
+
+    def level_top(self, level_name=None):
+        scores = self.top_scores.get(level_name)
+        if scores is None:
+            scores = self.top_scores[level_name] = [e['score'] for e in self.scores.top(level_name, MAX_HIGHSCORES)]
+        return scores
+
+    def get_top_score(self, level_name=None):
+        scores = self.level_top(level_name)
+        return scores[0] if scores else 0
+
+    def qualifies(self, level_name, score):
+        """Попадёт ли счёт в таблицу рекордов уровня (по кэшу в памяти)."""
+        scores = self.level_top(level_name)
+        return len(scores) < MAX_HIGHSCORES or score > scores[-1]
+
+    def check_and_save_score(self, score, recording=None):
+        """Сохраняет каждый заезд; запись партии — только если счёт попал в таблицу рекордов уровня."""
+        level_name = recording.level_name if recording is not None else None
+        # Стресс-уровни (замеры через bench.py) в результаты не пишутся: столкновения там не заканчивают игру
+        if level_name is not None and level_name not in PLAYABLE_LEVELS: return
+        entry = {'score': score, 'level': level_name, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 'player': self.player, 'settings': dict(self.settings)}
+        if recording is not None:
+            entry['seed'] = recording.seed
+            entry['ticks'] = len(recording.inputs)
+            if self.qualifies(level_name, score):
+                # Запись партии сохраняется рядом, чтобы рекорд можно было проверить через replay.py verify
+                name = f"{time.strftime('%Y%m%d-%H%M%S')}-{recording.seed:x}.rpl"
+                try:
+                    recording.save(os.path.join(self.replay_dir, name))
+                    entry['replay'] = name
+                except OSError as e:
+                    print(f"Warning: Could not save replay {name}: {e}")
+        self.scores.record(entry)
+        for key in (level_name, None):
+            scores = self.top_scores.get(key)
+            if scores is None: continue
+            scores.append(score)
+            scores.sort(reverse=True)
+            del scores[MAX_HIGHSCORES:]
+
+    def flush(self):
+        """Синхронно дописывает на диск всё, что ещё не сохранено (вызывается при выходе)."""
+        self.scores.flush()
 
 
 class BaseMenuWidget(QWidget):
@@ -359,7 +706,7 @@ class SettingsWidget(BaseMenuWidget):
         graphics_label = QLabel("Графика");
         graphics_label.setStyleSheet("font-size: 20px; font-weight: normal;")
         self.graphics_combo = QComboBox();
-        self.graphics_combo.addItems(GRAPHICS_SETTINGS.keys())
+        self.graphics_combo.addItems([*GRAPHICS_SETTINGS, AUTO_GRAPHICS])
         grid_layout.addWidget(graphics_label, 1, 0);
         grid_layout.addWidget(self.graphics_combo, 1, 1)
         accel_label = QLabel("Ускорение");
@@ -410,7 +757,7 @@ class HighScoresWidget(BaseMenuWidget):
                                                                                        alignment=Qt.AlignmentFlag.AlignCenter)
         else:
             for i, record in enumerate(scores): score_label = QLabel(
-                f"{i + 1}. {record['score']} очков"); score_label.setStyleSheet(
+                f"{i + 1}. {record['score']} очков" + (f" — {record['level']}" if 'level' in record else "")); score_label.setStyleSheet(
                 "font-size: 22px; font-weight: normal;"); self.scores_layout.addWidget(score_label,
                                                                                        alignment=Qt.AlignmentFlag.AlignCenter)
         super().showEvent(event)
@@ -423,7 +770,7 @@ class LevelSelectWidget(BaseMenuWidget):
         super().__init__();
         title = QLabel("Выберите уровень");
         self.layout.addWidget(title, alignment=Qt.AlignmentFlag.AlignCenter)
-        for level_name in LEVEL_SETTINGS.keys(): btn = QPushButton(level_name); btn.clicked.connect(
+        for level_name in PLAYABLE_LEVELS: btn = QPushButton(level_name); btn.clicked.connect(
             lambda checked, name=level_name: self.levelSelected.emit(name)); self.layout.addWidget(btn)
 
 
@@ -446,33 +793,121 @@ class GameOverWidget(BaseMenuWidget):
     def set_score(self, score): self.score_label.setText(f"Ваш итоговый счет: {score}")
 
 
-class MainWindow(QMainWindow):
+class StartupTimer:
+    """Отметки времени запуска от старта процесса до готовности игрового экрана."""
+
     def __init__(self):
+        self.marks = [('старт main.py', PROCESS_STARTED), ('импорт PyQt6', PYQT_IMPORTED),
+                      ('импорт модулей игры', GAME_MODULES_IMPORTED)]
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter()))
+
+    def report(self):
+        lines = ["Время запуска (мс): этап / с начала"]
+        previous = self.marks[0][1]
+        for label, moment in self.marks[1:]:
+            lines.append(f"  {label:<28} {(moment - previous) * 1000:8.1f} {(moment - PROCESS_STARTED) * 1000:8.1f}")
+            previous = moment
+        print('\n'.join(lines), file=sys.stderr)
+
+
+STARTUP = StartupTimer()
+
+
+class MainWindow(QMainWindow):
+    def __init__(self, settings_manager=None):
         super().__init__();
         self.setWindowTitle("2D Traffic Racer на PyQt6");
         self.setFixedSize(SCREEN_WIDTH, SCREEN_HEIGHT)
-        self.settings_manager = SettingsManager();
+        self.settings_manager = settings_manager or SettingsManager();
+        # Пока строится меню, изображения игры декодируются и масштабируются в фоновом потоке
+        ASSET_CACHE.prefetch(GAME_ASSETS, graphics_quality(self.settings_manager.get_setting('graphics')))
         self.stacked_widget = QStackedWidget();
         self.setCentralWidget(self.stacked_widget)
+        # Сразу создаётся только главное меню, остальные экраны — при первом обращении,
+        # а игровой экран прогревается после первой отрисовки меню, звук — следующим проходом цикла событий
+        self.pages = {}
         self.main_menu = MainMenuWidget();
-        self.settings_widget = SettingsWidget(self.settings_manager)
-        self.highscores_widget = HighScoresWidget(self.settings_manager);
-        self.level_select = LevelSelectWidget()
-        self.game_widget = GameWidget(self.settings_manager);
-        self.game_over_widget = GameOverWidget()
-        widgets = [self.main_menu, self.settings_widget, self.highscores_widget, self.level_select, self.game_widget,
-                   self.game_over_widget]
-        for w in widgets: self.stacked_widget.addWidget(w)
+        self.stacked_widget.addWidget(self.main_menu)
         self.main_menu.showLevelSelect.connect(self.show_level_select);
         self.main_menu.showSettings.connect(self.show_settings);
         self.main_menu.showHighScores.connect(self.show_highscores)
-        self.settings_widget.backToMenu.connect(self.show_main_menu);
-        self.highscores_widget.backToMenu.connect(self.show_main_menu)
-        self.level_select.levelSelected.connect(self.start_game);
-        self.game_widget.gameOver.connect(self.show_game_over)
-        self.game_over_widget.restartGame.connect(self.show_level_select);
-        self.game_over_widget.backToMenu.connect(self.show_main_menu)
+        self.main_menu.installEventFilter(self)
         self.show_main_menu()
+        STARTUP.mark('MainWindow')
+
+    def eventFilter(self, watched, event):
+        if watched is self.main_menu and event.type() == QEvent.Type.Paint:
+            self.main_menu.removeEventFilter(self)
+            QTimer.singleShot(0, self.warm_up)
+        return super().eventFilter(watched, event)
+
+    def warm_up(self):
+        STARTUP.mark('первая отрисовка меню')
+        # Звук GameWidget загрузит сам следующим проходом цикла событий, здесь меню не ждёт его
+        self.game_widget
+        STARTUP.mark('игровой экран')
+        profile = os.environ.get(STARTUP_PROFILE_ENV)
+        if profile:
+            STARTUP.report()
+            if profile == 'exit': QApplication.instance().quit()
+
+    # --- Ленивое создание экранов ---
+    def page(self, name, factory):
+        widget = self.pages.get(name)
+        if widget is None:
+            widget = self.pages[name] = factory()
+            self.stacked_widget.addWidget(widget)
+            # Размер страницы стек выставит лишь при следующей раскладке, а GameWidget берёт размер поля сразу
+            widget.resize(self.stacked_widget.size())
+        return widget
+
+    @property
+    def settings_widget(self):
+        return self.page('settings', self.create_settings_widget)
+
+    def create_settings_widget(self):
+        widget = SettingsWidget(self.settings_manager)
+        widget.backToMenu.connect(self.show_main_menu)
+        return widget
+
+    @property
+    def highscores_widget(self):
+        return self.page('highscores', self.create_highscores_widget)
+
+    def create_highscores_widget(self):
+        widget = HighScoresWidget(self.settings_manager)
+        widget.backToMenu.connect(self.show_main_menu)
+        return widget
+
+    @property
+    def level_select(self):
+        return self.page('level_select', self.create_level_select)
+
+    def create_level_select(self):
+        widget = LevelSelectWidget()
+        widget.levelSelected.connect(self.start_game)
+        return widget
+
+    @property
+    def game_widget(self):
+        return self.page('game', self.create_game_widget)
+
+    def create_game_widget(self):
+        widget = GameWidget(self.settings_manager)
+        widget.gameOver.connect(self.show_game_over)
+        return widget
+
+    @property
+    def game_over_widget(self):
+        return self.page('game_over', self.create_game_over_widget)
+
+    def create_game_over_widget(self):
+        widget = GameOverWidget()
+        widget.restartGame.connect(self.show_level_select)
+        widget.backToMenu.connect(self.show_main_menu)
+        return widget
 
     def show_main_menu(self): self.stacked_widget.setCurrentWidget(self.main_menu)
 
@@ -491,6 +926,8 @@ class MainWindow(QMainWindow):
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    STARTUP.mark('QApplication')
     window = MainWindow()
+    app.aboutToQuit.connect(window.settings_manager.flush)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""Покадровый профилировщик GameWidget.
+
+Включается переменной окружения PYGAME_PROFILE=1 или клавишей F3 во время игры,
+F4 сохраняет буфер в формате Chrome trace (открывается в chrome://tracing или Perfetto).
+Для каждого кадра хранится время начала и суммарная длительность секций update,
+paint, hud, sound и пауз сборщика мусора; буфер кольцевой и выделяется один раз.
+Пока профилировщик выключен, GameWidget держит вместо него None и платит только
+за проверку атрибута.
+"""
+import gc
+import json
+import os
+import time
+
+from PyQt6.QtCore import QRect
+from PyQt6.QtGui import QColor
+
+PROFILE_ENV = 'PYGAME_PROFILE'
+TRACE_DIR_NAME = 'traces'
+
+SECTION_UPDATE = 0
+SECTION_PAINT = 1
+SECTION_HUD = 2
+SECTION_SOUND = 3
+SECTION_GC = 4
+SECTION_NAMES = ('update', 'paint', 'hud', 'sound', 'gc')
+
+OVERLAY_SIZE = (240, 80)
+OVERLAY_FRAMES = 120
+OVERLAY_SCALE_MS = 33.3  # высота графика соответствует двум кадрам при 60 FPS
+FRAME_BUDGET_MS = 1000 / 60
+SECTION_COLORS = ((52, 152, 219), (46, 204, 113), (241, 196, 15), (155, 89, 182), (231, 76, 60))
+
+
+class FrameProfiler:
+    def __init__(self, capacity=600):
+        self.capacity = capacity
+        sections = len(SECTION_NAMES)
+        self.frame_start = [0] * capacity
+        self.frame_end = [0] * capacity
+        # Для секции s кадра i: первое начало и суммарная длительность, индекс i * sections + s
+        self.section_start = [0] * (capacity * sections)
+        self.section_total = [0] * (capacity * sections)
+        self.frames = 0
+        self.current = 0
+        self.overlay = True
+        self.clock = time.perf_counter_ns
+        self.origin = self.clock()
+        self._gc_started = 0
+        gc.callbacks.append(self._on_gc)
+
+    def close(self):
+        if self._on_gc in gc.callbacks: gc.callbacks.remove(self._on_gc)
+
+    # --- Запись ---
+    def begin_frame(self):
+        now = self.clock()
+        self.current = i = self.frames % self.capacity
+        self.frames += 1
+        self.frame_start[i] = now
+        self.frame_end[i] = now
+        base = i * len(SECTION_NAMES)
+        for s in range(base, base + len(SECTION_NAMES)):
+            self.section_start[s] = 0
+            self.section_total[s] = 0
+
+    def add(self, section, start_ns, end_ns):
+        s = self.current * len(SECTION_NAMES) + section
+        if not self.section_total[s] and not self.section_start[s]: self.section_start[s] = start_ns
+        self.section_total[s] += end_ns - start_ns
+        if end_ns > self.frame_end[self.current]: self.frame_end[self.current] = end_ns
+
+    def _on_gc(self, phase, info):
+        if not self.frames: return
+        if phase == 'start':
+            self._gc_started = self.clock()
+        elif self._gc_started:
+            self.add(SECTION_GC, self._gc_started, self.clock())
+            self._gc_started = 0
+
+    def recent_frames(self, count=None):
+        """Индексы последних кадров в буфере, от старых к новым."""
+        available = min(self.frames, self.capacity)
+        count = available if count is None else min(count, available)
+        return [(self.frames - count + k) % self.capacity for k in range(count)]
+
+    def section_ms(self, frame, section):
+        return self.section_total[frame * len(SECTION_NAMES) + section] / 1e6
+
+    # --- Отображение ---
+    def draw_overlay(self, painter, x, y):
+        width, height = OVERLAY_SIZE
+        painter.fillRect(QRect(x, y, width, height), QColor(0, 0, 0, 160))
+        frames = self.recent_frames(OVERLAY_FRAMES)
+        bar = width / OVERLAY_FRAMES
+        scale = height / OVERLAY_SCALE_MS
+        colors = [QColor(*color) for color in SECTION_COLORS]
+        for k, frame in enumerate(frames):
+            left = x + int(k * bar)
+            bottom = y + height
+            # Секции hud и sound вложены в paint и update, поэтому в столбике рисуются только
+            # update, остаток paint без hud, hud и сборка мусора
+            parts = (self.section_ms(frame, SECTION_UPDATE), self.section_ms(frame, SECTION_PAINT)
+                     - self.section_ms(frame, SECTION_HUD), self.section_ms(frame, SECTION_HUD),
+                     self.section_ms(frame, SECTION_GC))
+            for part, color in zip(parts, (colors[SECTION_UPDATE], colors[SECTION_PAINT], colors[SECTION_HUD],
+                                           colors[SECTION_GC])):
+                bar_height = int(max(part, 0) * scale)
+                if bar_height <= 0: continue
+                bar_height = min(bar_height, bottom - y)
+                painter.fillRect(QRect(left, bottom - bar_height, max(int(bar), 1), bar_height), color)
+                bottom -= bar_height
+        budget_y = y + height - int(FRAME_BUDGET_MS * scale)
+        painter.setPen(QColor(255, 255, 255, 180))
+        painter.drawLine(x, budget_y, x + width, budget_y)
+        if frames:
+            last = frames[-1]
+            frame_ms = (self.frame_end[last] - self.frame_start[last]) / 1e6
+            painter.drawText(x + 4, y + 14, f"{frame_ms:.2f} ms")
+
+    # --- Экспорт ---
+    def chrome_trace(self):
+        """Буфер в формате Chrome trace events (время в микросекундах от создания профилировщика)."""
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': '2D Traffic Racer'}}]
+        for frame in self.recent_frames():
+            start = self.frame_start[frame]
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': (start - self.origin) / 1000,
+                           'dur': (self.frame_end[frame] - start) / 1000})
+            for section, name in enumerate(SECTION_NAMES):
+                s = frame * len(SECTION_NAMES) + section
+                if not self.section_total[s]: continue
+                # Несколько вызовов секции за кадр сведены в одно событие с суммарной длительностью
+                events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                               'ts': (self.section_start[s] - self.origin) / 1000,
+                               'dur': self.section_total[s] / 1000})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump_chrome_trace(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+        return path
@@ -0,0 +1,296 @@
+"""Запись партий и их проверка повторной симуляцией без окна.
+
+Запись хранит всё, от чего зависит ход игры: уровень, зерно ГСЧ, режим ускорения,
+размеры машин и поля, а также маску клавиш INPUT_* на каждом тике (по два тика в
+байте, затем zlib). Партия по расписанию движения (traffic.py) хранит ещё путь, хеш
+и длину расписания и проигрывается по нему же. Повтор прогоняет те же маски через
+GameEngine и сверяет итоговый счёт, так что рекорды можно проверять пачками:
+
+    python replay.py verify replays/*.rpl
+    python replay.py verify --traffic hard.pgts replays/*.rpl
+    python replay.py record --level Сложный --seed 7 --out run.rpl
+"""
+import argparse
+import glob
+import os
+import struct
+import sys
+import time
+import zlib
+
+from engine import (BASE_DIR, SCREEN_WIDTH, SCREEN_HEIGHT, LEVEL_SETTINGS, GRAPHICS_SETTINGS, FPS, GameEngine,
+                    sprite_sizes)
+from traffic import TRAFFIC_ENV, TrafficError, TrafficSchedule, ScheduleSource
+
+REPLAY_DIR = os.path.join(BASE_DIR, 'replays')
+REPLAY_MAGIC = b'PGRP'
+REPLAY_VERSION = 2  # версия 1 — без расписания движения
+FLAG_AUTO_ACCEL = 1
+FLAG_CRASHED = 2
+FLAG_TRAFFIC = 4
+FLAG_TRAFFIC_LOOP = 8
+
+# magic, версия, флаги, зерно, ширина и высота поля, размер игрока, число тиков, счёт, число спрайтов соперников
+_HEADER = struct.Struct('<4sBBQHHHHIqB')
+_SIZE = struct.Struct('<HH')
+# хеш расписания, его длина в тиках, длина пути к нему (сам путь следует за этим)
+_TRAFFIC = struct.Struct('<8sIH')
+
+
+class ReplayError(ValueError):
+    pass
+
+
+_allowed_sizes = None
+
+
+def allowed_sprite_sizes():
+    """Размеры (игрок, соперники), возможные в настоящей игре: по одному набору на качество графики."""
+    global _allowed_sizes
+    if _allowed_sizes is None:
+        _allowed_sizes = {sprite_sizes(quality) for quality in GRAPHICS_SETTINGS.values()}
+    return _allowed_sizes
+
+
+class TrafficInfo:
+    """Расписание движения, по которому шла партия: путь (подсказка для поиска), хеш и длина."""
+
+    def __init__(self, path, digest, ticks, loop):
+        self.path = path
+        self.digest = digest
+        self.ticks = ticks
+        self.loop = loop
+
+    @classmethod
+    def from_source(cls, source):
+        schedule = source.schedule
+        return cls(schedule.path, schedule.digest, schedule.ticks, source.loop)
+
+    def matches(self, schedule):
+        return schedule.digest == self.digest and schedule.ticks == self.ticks
+
+
+class Recording:
+    def __init__(self, level_name, seed, auto_accel, player_size, enemy_sizes, width, height,
+                 inputs=None, final_score=0, crashed=False, traffic=None):
+        self.level_name = level_name
+        self.seed = seed
+        self.auto_accel = auto_accel
+        self.player_size = tuple(player_size)
+        self.enemy_sizes = tuple(tuple(size) for size in enemy_sizes)
+        self.width = width
+        self.height = height
+        self.inputs = bytearray() if inputs is None else bytearray(inputs)
+        self.final_score = final_score
+        self.crashed = crashed
+        self.traffic = traffic
+
+    def new_engine(self, schedule=None):
+        """Движок для повтора; партии по расписанию нужно то же самое расписание (см. TrafficInfo)."""
+        spawn_source = None
+        if self.traffic is not None:
+            if schedule is None or not self.traffic.matches(schedule):
+                raise ReplayError(f"нужно расписание движения {self.traffic.path}")
+            spawn_source = ScheduleSource(schedule, self.traffic.loop)
+        return GameEngine(self.level_name, self.player_size, self.enemy_sizes, self.width, self.height,
+                          auto_accel=self.auto_accel, seed=self.seed, spawn_source=spawn_source)
+
+    # --- Бинарный формат ---
+    def to_bytes(self):
+        inputs = self.inputs
+        packed = bytearray((len(inputs) + 1) // 2)
+        for i in range(0, len(inputs) - 1, 2):
+            packed[i >> 1] = inputs[i] | (inputs[i + 1] << 4)
+        if len(inputs) % 2:
+            packed[-1] = inputs[-1]
+        level = self.level_name.encode('utf-8')
+        flags = (FLAG_AUTO_ACCEL if self.auto_accel else 0) | (FLAG_CRASHED if self.crashed else 0)
+        traffic = b''
+        if self.traffic is not None:
+            flags |= FLAG_TRAFFIC | (FLAG_TRAFFIC_LOOP if self.traffic.loop else 0)
+            path = self.traffic.path.encode('utf-8')
+            traffic = _TRAFFIC.pack(self.traffic.digest, self.traffic.ticks, len(path)) + path
+        header = _HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, flags, self.seed, self.width, self.height,
+                              self.player_size[0], self.player_size[1], len(inputs), self.final_score,
+                              len(self.enemy_sizes))
+        sizes = b''.join(_SIZE.pack(*size) for size in self.enemy_sizes)
+        return header + sizes + bytes([len(level)]) + level + traffic + zlib.compress(bytes(packed), 9)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < _HEADER.size or data[:4] != REPLAY_MAGIC:
+            raise ReplayError("не файл записи партии")
+        try:
+            (_, version, flags, seed, width, height, player_w, player_h, ticks, final_score,
+             enemy_count) = _HEADER.unpack_from(data)
+            if version not in (1, REPLAY_VERSION):
+                raise ReplayError(f"неподдерживаемая версия записи: {version}")
+            offset = _HEADER.size
+            enemy_sizes = [_SIZE.unpack_from(data, offset + i * _SIZE.size) for i in range(enemy_count)]
+            offset += enemy_count * _SIZE.size
+            level_len = data[offset]
+            level_name = data[offset + 1:offset + 1 + level_len].decode('utf-8')
+            offset += 1 + level_len
+            traffic = None
+            if flags & FLAG_TRAFFIC:
+                digest, schedule_ticks, path_len = _TRAFFIC.unpack_from(data, offset)
+                offset += _TRAFFIC.size
+                if offset + path_len > len(data): raise IndexError("путь к расписанию")
+                path = data[offset:offset + path_len].decode('utf-8')
+                offset += path_len
+                traffic = TrafficInfo(path, digest, schedule_ticks, bool(flags & FLAG_TRAFFIC_LOOP))
+            packed = zlib.decompress(data[offset:])
+        except (struct.error, IndexError) as e:
+            raise ReplayError(f"запись обрезана: {e}") from e
+        except UnicodeDecodeError as e:
+            raise ReplayError(f"повреждённая строка в заголовке: {e}") from e
+        except zlib.error as e:
+            raise ReplayError(f"повреждённый поток ввода: {e}") from e
+        if len(packed) != (ticks + 1) // 2:
+            raise ReplayError("длина потока ввода не совпадает с числом тиков")
+        inputs = bytearray(ticks)
+        for i in range(ticks):
+            byte = packed[i >> 1]
+            inputs[i] = (byte >> 4) if i & 1 else (byte & 0x0F)
+        recording = cls(level_name, seed, bool(flags & FLAG_AUTO_ACCEL), (player_w, player_h), enemy_sizes, width,
+                        height, inputs, final_score, bool(flags & FLAG_CRASHED), traffic)
+        recording.validate()
+        return recording
+
+    def validate(self):
+        """Отклоняет параметры, которых не бывает в настоящей игре: иначе подделанный заголовок
+        (например, машины 1x1) даёт рекорд, который честно пересчитывается."""
+        if self.level_name not in LEVEL_SETTINGS:
+            raise ReplayError(f"неизвестный уровень: {self.level_name!r}")
+        if (self.width, self.height) != (SCREEN_WIDTH, SCREEN_HEIGHT):
+            raise ReplayError(f"размер поля {self.width}x{self.height} вместо {SCREEN_WIDTH}x{SCREEN_HEIGHT}")
+        if (self.player_size, self.enemy_sizes) not in allowed_sprite_sizes():
+            raise ReplayError("размеры машин не соответствуют ни одному качеству графики")
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class Recorder:
+    """Пишет маски ввода партии, идущей на переданном движке."""
+
+    def __init__(self, engine):
+        source = engine.spawn_source
+        traffic = TrafficInfo.from_source(source) if isinstance(source, ScheduleSource) else None
+        self.recording = Recording(engine.level_name, engine.seed, engine.auto_accel,
+                                   (engine.player_w, engine.player_h), engine.enemy_sizes, engine.width, engine.height,
+                                   traffic=traffic)
+        self.append = self.recording.inputs.append
+
+    def record(self, inputs):
+        self.append(inputs)
+
+    def finish(self, engine):
+        self.recording.final_score = engine.score
+        self.recording.crashed = not engine.running
+        return self.recording
+
+
+def replay(recording, schedule=None):
+    """Заново проигрывает запись и возвращает движок в конечном состоянии."""
+    engine = recording.new_engine(schedule)
+    step = engine.step
+    for inputs in recording.inputs:
+        if not step(inputs): break
+    return engine
+
+
+def verify(recording, schedule=None):
+    """Возвращает (совпало ли, пересчитанный счёт). Столкновение (или конец расписания) должно прийтись
+    ровно на последний тик."""
+    engine = replay(recording, schedule)
+    ok = (engine.score == recording.final_score and engine.ticks == len(recording.inputs)
+          and (not engine.running) == recording.crashed)
+    return ok, engine.score
+
+
+def find_schedule(traffic, schedules):
+    """Расписание партии среди открытых (по хешу), иначе по пути, записанному в партии; None, если не нашлось."""
+    for schedule in schedules:
+        if traffic.matches(schedule): return schedule
+    if traffic.path in (schedule.path for schedule in schedules) or not os.path.exists(traffic.path): return None
+    try:
+        schedule = TrafficSchedule(traffic.path)
+    except (OSError, TrafficError):
+        return None
+    schedules.append(schedule)
+    return schedule if traffic.matches(schedule) else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Запись и проверка партий 2D Traffic Racer")
+    commands = parser.add_subparsers(dest='command', required=True)
+    verify_parser = commands.add_parser('verify', help="пересчитать записи и сверить счёт")
+    verify_parser.add_argument('paths', nargs='*', help=f"файлы записей (по умолчанию {REPLAY_DIR}/*.rpl)")
+    verify_parser.add_argument('--traffic', action='append', default=[],
+                               help=f"расписания движения для партий по расписанию (также {TRAFFIC_ENV})")
+    record_parser = commands.add_parser('record', help="сыграть партию автопилотом и сохранить запись")
+    record_parser.add_argument('--level', choices=LEVEL_SETTINGS, default='Средний')
+    record_parser.add_argument('--seed', type=int, default=0)
+    record_parser.add_argument('--driver', default='autopilot')
+    record_parser.add_argument('--max-ticks', type=int, default=FPS * 300)
+    record_parser.add_argument('--out', required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        from simulate import DRIVERS
+        engine = GameEngine(args.level, seed=args.seed)
+        recorder = Recorder(engine)
+        driver = DRIVERS[args.driver](args.seed)
+        for _ in range(args.max_ticks):
+            inputs = driver(engine)
+            recorder.record(inputs)
+            if not engine.step(inputs): break
+        recorder.finish(engine).save(args.out)
+        print(f"{args.out}: {engine.ticks} тиков, счёт {engine.score}")
+        return 0
+
+    paths = args.paths or sorted(glob.glob(os.path.join(REPLAY_DIR, '*.rpl')))
+    schedules = []
+    for path in args.traffic + [os.environ.get(TRAFFIC_ENV) or '']:
+        if not path: continue
+        try:
+            schedules.append(TrafficSchedule(path))
+        except (OSError, TrafficError) as e:
+            print(f"Warning: Could not open traffic schedule {path}: {e}")
+    failures = 0
+    total_ticks = 0
+    started = time.perf_counter()
+    for path in paths:
+        try:
+            recording = Recording.load(path)
+        except (OSError, ReplayError) as e:
+            print(f"{path}: ОШИБКА {e}")
+            failures += 1
+            continue
+        schedule = find_schedule(recording.traffic, schedules) if recording.traffic is not None else None
+        try:
+            ok, score = verify(recording, schedule)
+        except ReplayError as e:
+            print(f"{path}: ОШИБКА {e}")
+            failures += 1
+            continue
+        total_ticks += len(recording.inputs)
+        if not ok: failures += 1
+        print(f"{path}: {'OK' if ok else 'НЕ СОВПАДАЕТ'} (заявлено {recording.final_score}, пересчитано {score})")
+    elapsed = time.perf_counter() - started
+    if paths and elapsed:
+        print(f"{len(paths)} записей, {total_ticks} тиков за {elapsed:.2f} с "
+              f"({total_ticks / elapsed / FPS:.0f}x быстрее реального времени)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
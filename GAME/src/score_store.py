@@ -0,0 +1,450 @@
+"""Хранилища результатов заездов.
+
+Запись о заезде — словарь: score, level, timestamp (ISO, местное время), player,
+settings (настройки игры на момент заезда), seed, ticks и, если партия попала в
+таблицу рекордов уровня, replay — имя файла записи в replays/.
+
+ScoreStore задаёт общий интерфейс, реализаций две:
+  * SqliteScoreStore — по умолчанию, файл scores.db. Хранит все заезды, индекс
+    (level, score) даёт top-K и процентили уровня без полного просмотра таблицы.
+    Записи копятся в очереди и пишутся пачкой в одной транзакции из фонового потока;
+    запросы не ждут записи, а добавляют ещё не записанные заезды к прочитанным из базы.
+    База в режиме WAL с busy_timeout, так что несколько процессов игры могут писать в
+    один файл одновременно.
+  * JsonScoreStore — прежний highscores.json: только лучшие MAX_HIGHSCORES заездов
+    каждого уровня.
+
+Хранилище выбирается переменной окружения PYGAME_SCORE_STORE (sqlite или json).
+Формат highscores.json остаётся форматом импорта и экспорта:
+
+    python score_store.py top --level Сложный
+    python score_store.py percentile --level Сложный --score 2000
+    python score_store.py import highscores.json
+    python score_store.py export top.json --level Средний
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+from engine import BASE_DIR, LEVEL_SETTINGS
+
+HIGHSCORE_FILE = 'highscores.json'
+SCORE_DB_FILE = 'scores.db'
+SCORE_STORE_ENV = 'PYGAME_SCORE_STORE'
+MAX_HIGHSCORES = 10
+BUSY_TIMEOUT_MS = 5000
+
+ENTRY_FIELDS = ('score', 'level', 'timestamp', 'player', 'settings', 'seed', 'ticks', 'replay')
+
+
+class ScoreStore:
+    """Общий интерфейс; level=None во всех запросах означает «все уровни»."""
+
+    def record(self, entry):
+        """Ставит заезд в очередь на запись; на диск он попадёт в фоне или при flush()."""
+        raise NotImplementedError
+
+    def record_many(self, entries):
+        for entry in entries: self.record(entry)
+
+    def top(self, level=None, limit=MAX_HIGHSCORES):
+        """Лучшие заезды по убыванию счёта; при равном счёте раньше идёт более ранний."""
+        raise NotImplementedError
+
+    def count(self, level=None):
+        raise NotImplementedError
+
+    def percentile_rank(self, level, score):
+        """Доля заездов уровня (0–100) со счётом строго ниже заданного."""
+        raise NotImplementedError
+
+    def score_at_percentile(self, level, percent):
+        """Счёт, который не превосходят percent процентов заездов уровня (ближайший ранг)."""
+        raise NotImplementedError
+
+    def import_json(self, path):
+        """Добавляет заезды из файла в формате highscores.json; возвращает их число."""
+        entries = read_json_entries(path)
+        self.record_many(entries)
+        self.flush()
+        return len(entries)
+
+    def export_json(self, path, level=None, limit=MAX_HIGHSCORES):
+        entries = self.top(level, limit)
+        write_json_atomic(path, entries)
+        return len(entries)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+def normalize_entry(entry):
+    """Словарь заезда с известными полями; старые записи highscores.json содержат только score."""
+    entry = {key: entry[key] for key in ENTRY_FIELDS if entry.get(key) is not None}
+    entry['score'] = int(entry['score'])
+    return entry
+
+
+def read_json_entries(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [normalize_entry(entry) for entry in json.load(f)]
+
+
+def write_json_atomic(path, entries):
+    # Пишем во временный файл рядом и атомарно подменяем им основной
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.highscores-',
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+
+class BackgroundWriter:
+    """Фоновый поток, который по сигналу вызывает write_pending хранилища."""
+
+    def __init__(self, write_pending, name):
+        self.write_pending = write_pending
+        self.name = name
+        self.thread = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def wake(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def _loop(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            self.write_pending()
+
+
+class JsonScoreStore(ScoreStore):
+    """Лучшие keep заездов каждого уровня в JSON-файле; процентили считаются по ним же, то есть приблизительно.
+
+    Списки именно по уровням: общий top-keep почти целиком занимают сложные уровни, и
+    рекорды лёгкого уровня из него вытеснялись бы.
+    """
+
+    def __init__(self, path=None, keep=MAX_HIGHSCORES):
+        self.path = path or os.path.join(BASE_DIR, HIGHSCORE_FILE)
+        self.keep = keep
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = BackgroundWriter(self._write_pending, 'highscores-writer')
+        self.entries = self._read()
+
+    def _read(self):
+        try:
+            return read_json_entries(self.path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def record(self, entry):
+        self.record_many([entry])
+
+    def record_many(self, entries):
+        # sorted устойчива, поэтому при равном счёте старые записи остаются выше новых
+        merged = sorted(self.entries + [normalize_entry(entry) for entry in entries],
+                        key=lambda x: x['score'], reverse=True)
+        kept = {}
+        self.entries = []
+        for entry in merged:
+            level = entry.get('level')
+            if kept.get(level, 0) < self.keep:
+                kept[level] = kept.get(level, 0) + 1
+                self.entries.append(entry)
+        with self._pending_lock:
+            self._pending = list(self.entries)
+        self._writer.wake()
+
+    def _matching(self, level):
+        return [entry for entry in self.entries if level is None or entry.get('level') == level]
+
+    def top(self, level=None, limit=MAX_HIGHSCORES):
+        return [dict(entry) for entry in self._matching(level)[:limit]]
+
+    def count(self, level=None):
+        return len(self._matching(level))
+
+    def percentile_rank(self, level, score):
+        scores = [entry['score'] for entry in self._matching(level)]
+        return 100.0 * sum(1 for s in scores if s < score) / len(scores) if scores else 0.0
+
+    def score_at_percentile(self, level, percent):
+        scores = sorted(entry['score'] for entry in self._matching(level))
+        if not scores: return None
+        return scores[min(len(scores) - 1, max(0, -(-len(scores) * percent // 100) - 1))]
+
+    # --- Отложенная запись на диск в фоновом потоке ---
+    def _write_pending(self):
+        # Снимок берётся под _write_lock, поэтому более старый снимок не может перезаписать более новый
+        with self._write_lock:
+            with self._pending_lock:
+                entries, self._pending = self._pending, None
+            if entries is None: return
+            try:
+                write_json_atomic(self.path, entries)
+            except OSError as e:
+                print(f"Warning: Could not save highscores: {e}")
+
+    def flush(self):
+        """Синхронно дописывает на диск всё, что ещё не сохранено (вызывается при выходе)."""
+        self._write_pending()
+
+
+class SqliteScoreStore(ScoreStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            level TEXT,
+            score INTEGER NOT NULL,
+            timestamp TEXT,
+            player TEXT,
+            settings TEXT,
+            seed INTEGER,
+            ticks INTEGER,
+            replay TEXT
+        );
+        CREATE INDEX IF NOT EXISTS runs_level_score ON runs (level, score DESC);
+        CREATE INDEX IF NOT EXISTS runs_score ON runs (score DESC);
+    """
+    INSERT = ("INSERT INTO runs (level, score, timestamp, player, settings, seed, ticks, replay) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+    COLUMNS = "score, level, timestamp, player, settings, seed, ticks, replay"
+
+    # user_version базы: 0 — рекорды из highscores.json ещё не забирались
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path=None, import_from=None):
+        self.path = path or os.path.join(BASE_DIR, SCORE_DB_FILE)
+        # Соединение записи (писатель и импорт, под _db_lock) и отдельное соединение запросов:
+        # в режиме WAL чтение не ждёт чужую транзакцию записи. Транзакциями управляем сами
+        self.db = self._connect()
+        self.reader = self._connect()
+        self._db_lock = threading.Lock()
+        # _pending — очередь, _writing — пачка в незавершённой транзакции; запросы учитывают обе
+        self._pending = []
+        self._writing = []
+        self._pending_lock = threading.Lock()
+        self._writer = BackgroundWriter(self._write_pending, 'scores-writer')
+        with self._db_lock:
+            self.db.execute("PRAGMA journal_mode = WAL")
+            self.db.execute("PRAGMA synchronous = NORMAL")
+            self.db.executescript(self.SCHEMA)
+            self._import_once(import_from)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                             check_same_thread=False)
+        db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        return db
+
+    def _import_once(self, import_from):
+        """Новая база забирает рекорды из прежнего highscores.json.
+
+        Проверка и импорт идут в одной транзакции IMMEDIATE, поэтому из нескольких
+        процессов, одновременно открывших новую базу, импортирует ровно один. База,
+        созданная до появления user_version, уже с заездами, только получает отметку.
+        """
+        if self.db.execute("PRAGMA user_version").fetchone()[0] >= self.SCHEMA_VERSION: return
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                if (self.db.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION
+                        and self.db.execute("SELECT 1 FROM runs LIMIT 1").fetchone() is None
+                        and import_from and os.path.exists(import_from)):
+                    self.db.executemany(self.INSERT, [self._row(entry) for entry in read_json_entries(import_from)])
+                self.db.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        except (OSError, ValueError, KeyError, TypeError, sqlite3.Error) as e:
+            print(f"Warning: Could not import highscores from {import_from}: {e}")
+
+    @staticmethod
+    def _row(entry):
+        settings = entry.get('settings')
+        return (entry.get('level'), int(entry['score']), entry.get('timestamp'), entry.get('player'),
+                json.dumps(settings, ensure_ascii=False) if settings is not None else None,
+                entry.get('seed'), entry.get('ticks'), entry.get('replay'))
+
+    @staticmethod
+    def _entry(row):
+        entry = {key: value for key, value in zip(ENTRY_FIELDS, row) if value is not None}
+        if 'settings' in entry: entry['settings'] = json.loads(entry['settings'])
+        return entry
+
+    def record(self, entry):
+        with self._pending_lock:
+            self._pending.append(self._row(entry))
+        self._writer.wake()
+
+    def record_many(self, entries):
+        with self._pending_lock:
+            self._pending.extend(self._row(entry) for entry in entries)
+        self._writer.wake()
+
+    def _write_pending(self):
+        with self._db_lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, []
+                self._writing = rows
+            if not rows: return
+            try:
+                # IMMEDIATE сразу берёт блокировку записи: другой процесс подождёт busy_timeout, а не упадёт посреди транзакции
+                self.db.execute("BEGIN IMMEDIATE")
+                try:
+                    self.db.executemany(self.INSERT, rows)
+                    # Запрос под _pending_lock видит пачку либо в базе, либо в _writing, но не дважды
+                    with self._pending_lock:
+                        self.db.execute("COMMIT")
+                        self._writing = []
+                except BaseException:
+                    self.db.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                print(f"Warning: Could not save scores: {e}")
+                # Заезды не теряются: вернутся в очередь и уйдут со следующей пачкой
+                with self._pending_lock:
+                    self._pending[:0] = rows
+                    self._writing = []
+
+    def flush(self):
+        """Синхронно записывает очередь (вызывается при выходе и после импорта)."""
+        self._write_pending()
+
+    def _unwritten(self, level):
+        """Ещё не записанные заезды уровня как строки в порядке COLUMNS; вызывается под _pending_lock."""
+        return [(row[1], row[0]) + row[2:] for row in self._writing + self._pending
+                if level is None or row[0] == level]
+
+    def top(self, level=None, limit=MAX_HIGHSCORES):
+        where, params = self._level_filter(level)
+        with self._pending_lock:
+            rows = self.reader.execute(f"SELECT {self.COLUMNS} FROM runs WHERE {where} ORDER BY score DESC, id LIMIT ?",
+                                       params + (limit,)).fetchall()
+            unwritten = self._unwritten(level)
+        # sorted устойчива: при равном счёте записанные (более ранние) заезды остаются выше
+        return [self._entry(row) for row in sorted(rows + unwritten, key=lambda row: row[0], reverse=True)[:limit]]
+
+    @staticmethod
+    def _level_filter(level):
+        """Условие отбора по уровню; None — все уровни (сравнение «level = NULL» не совпало бы ни с чем)."""
+        return ("level = ?", (level,)) if level is not None else ("1", ())
+
+    def _count(self, level):
+        where, params = self._level_filter(level)
+        return self.reader.execute(f"SELECT COUNT(*) FROM runs WHERE {where}", params).fetchone()[0]
+
+    def count(self, level=None):
+        with self._pending_lock:
+            return self._count(level) + len(self._unwritten(level))
+
+    def percentile_rank(self, level, score):
+        where, params = self._level_filter(level)
+        with self._pending_lock:
+            unwritten = [row[0] for row in self._unwritten(level)]
+            total = self._count(level) + len(unwritten)
+            if not total: return 0.0
+            below = self.reader.execute(f"SELECT COUNT(*) FROM runs WHERE {where} AND score < ?",
+                                        params + (score,)).fetchone()[0]
+        return 100.0 * (below + sum(1 for s in unwritten if s < score)) / total
+
+    def score_at_percentile(self, level, percent):
+        where, params = self._level_filter(level)
+        with self._pending_lock:
+            unwritten = [row[0] for row in self._unwritten(level)]
+            total = self._count(level) + len(unwritten)
+            if not total: return None
+            # Ранг в порядке возрастания переводится в смещение по индексу, отсортированному по убыванию
+            rank = min(total, max(1, -(-total * percent // 100)))
+            offset = int(total - rank)
+            # Первые offset - len(unwritten) заездов базы заведомо выше искомого, так что из базы
+            # нужно не больше len(unwritten) + 1 строк, а остальное решает слияние с очередью
+            skip = max(0, offset - len(unwritten))
+            rows = self.reader.execute(f"SELECT score FROM runs WHERE {where} ORDER BY score DESC LIMIT ? OFFSET ?",
+                                       params + (offset + 1 - skip, skip)).fetchall()
+        return sorted([row[0] for row in rows] + unwritten, reverse=True)[offset - skip]
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            self.db.close()
+        with self._pending_lock:
+            self.reader.close()
+
+
+SCORE_STORES = {'sqlite': SqliteScoreStore, 'json': JsonScoreStore}
+
+
+def open_score_store(kind=None):
+    kind = kind or os.environ.get(SCORE_STORE_ENV) or 'sqlite'
+    if kind not in SCORE_STORES:
+        print(f"Warning: Unknown score store '{kind}', using sqlite")
+        kind = 'sqlite'
+    if kind == 'sqlite':
+        return SqliteScoreStore(import_from=os.path.join(BASE_DIR, HIGHSCORE_FILE))
+    return JsonScoreStore()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Результаты заездов 2D Traffic Racer")
+    parser.add_argument('--store', choices=SCORE_STORES, help=f"по умолчанию из {SCORE_STORE_ENV} или sqlite")
+    commands = parser.add_subparsers(dest='command', required=True)
+    top_parser = commands.add_parser('top', help="лучшие заезды")
+    top_parser.add_argument('--level', choices=LEVEL_SETTINGS, help="по умолчанию все уровни")
+    top_parser.add_argument('-k', type=int, default=MAX_HIGHSCORES)
+    percentile_parser = commands.add_parser('percentile', help="место счёта среди заездов уровня")
+    percentile_parser.add_argument('--level', choices=LEVEL_SETTINGS, required=True)
+    percentile_parser.add_argument('--score', type=int, required=True)
+    import_parser = commands.add_parser('import', help="добавить заезды из JSON в формате highscores.json")
+    import_parser.add_argument('path')
+    export_parser = commands.add_parser('export', help="выгрузить лучшие заезды в JSON")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--level', choices=LEVEL_SETTINGS)
+    export_parser.add_argument('-k', type=int, default=MAX_HIGHSCORES)
+    args = parser.parse_args(argv)
+
+    store = open_score_store(args.store)
+    try:
+        if args.command == 'top':
+            for i, entry in enumerate(store.top(args.level, args.k)):
+                print(f"{i + 1:3}. {entry['score']:8} {entry.get('level', '-'):8} {entry.get('timestamp', '')} "
+                      f"{entry.get('player', '')}")
+        elif args.command == 'percentile':
+            total = store.count(args.level)
+            print(f"{args.level}: {total} заездов, счёт {args.score} выше, чем у "
+                  f"{store.percentile_rank(args.level, args.score):.1f}%")
+            if total:
+                print(' '.join(f"p{p}={store.score_at_percentile(args.level, p)}" for p in (50, 90, 99)))
+        elif args.command == 'import':
+            print(f"{args.path}: добавлено {store.import_json(args.path)} заездов")
+        else:
+            print(f"{args.path}: выгружено {store.export_json(args.path, args.level, args.k)} заездов")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Прогон партий без окна: python simulate.py --level Легкий --episodes 5000 --driver autopilot
+
+Каждая партия идёт на GameEngine с собственным зерном (base_seed + номер партии), поэтому
+результаты воспроизводимы и пригодны для регрессионных проверок счёта и сложности.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+from engine import (LEVEL_SETTINGS, PLAYABLE_LEVELS, GRAPHICS_SETTINGS, FPS, INPUT_UP, INPUT_DOWN, INPUT_LEFT,
+                    INPUT_RIGHT, GameEngine, sprite_sizes)
+
+
+# --- Сценарии управления: driver(engine) -> маска INPUT_* на текущий тик ---
+def idle_driver(seed):
+    return lambda engine: 0
+
+
+def gas_driver(seed):
+    return lambda engine: INPUT_UP
+
+
+def random_driver(seed, hold_ticks=15):
+    """Случайные комбинации клавиш, каждая удерживается hold_ticks тиков."""
+    rng = random.Random(seed)
+    state = {'mask': 0, 'left': 0}
+
+    def drive(engine):
+        if state['left'] <= 0:
+            state['mask'] = rng.choice((0, INPUT_UP, INPUT_DOWN)) | rng.choice((0, INPUT_LEFT, INPUT_RIGHT))
+            state['left'] = hold_ticks
+        state['left'] -= 1
+        return state['mask']
+
+    return drive
+
+
+def autopilot_driver(seed, lookahead=250):
+    """Простой автопилот: газ, а при машине впереди в своей полосе — уход в сторону с большим зазором."""
+
+    def drive(engine):
+        left, right = engine.player_x, engine.player_x + engine.player_w
+        top = engine.player_y
+        pool = engine.enemies
+        threat = -1
+        for i in range(pool.count):
+            x, y, w, h = pool.x[i], pool.y[i], pool.w[i], pool.h[i]
+            if x < right + 10 and x + w > left - 10 and top - lookahead < y + h <= top + engine.player_h:
+                if threat < 0 or y > pool.y[threat]: threat = i
+        if threat < 0: return INPUT_UP
+        x, y, w, h = pool.x[threat], pool.y[threat], pool.w[threat], pool.h[threat]
+        room_left = x - 110
+        room_right = engine.width - 110 - (x + w)
+        steer = INPUT_LEFT if room_left > room_right else INPUT_RIGHT
+        return steer | (INPUT_DOWN if y + h > top - 60 else INPUT_UP)
+
+    return drive
+
+
+DRIVERS = {'idle': idle_driver, 'gas': gas_driver, 'random': random_driver, 'autopilot': autopilot_driver}
+
+
+def run_episode(engine, driver, seed, max_ticks):
+    """Играет одну партию до столкновения или max_ticks. Возвращает (счёт, число тиков, была ли авария).
+
+    Авария на последнем тике тоже авария, поэтому по числу тиков её не отличить от дожития."""
+    engine.reset(seed)
+    step = engine.step
+    for _ in range(max_ticks):
+        if not step(driver(engine)): return engine.score, engine.ticks, True
+    return engine.score, engine.ticks, False
+
+
+def run_level(level_name, episodes, base_seed=0, driver_name='autopilot', max_ticks=FPS * 300,
+              graphics='Среднее', auto_accel=False):
+    player_size, enemy_sizes = sprite_sizes(GRAPHICS_SETTINGS[graphics])
+    engine = GameEngine(level_name, player_size, enemy_sizes, auto_accel=auto_accel)
+    scores, ticks, collisions = [], [], []
+    for i in range(episodes):
+        seed = base_seed + i
+        score, survived, _ = run_episode(engine, DRIVERS[driver_name](seed), seed, max_ticks)
+        scores.append(score)
+        ticks.append(survived)
+        collisions.append(engine.collisions)
+    return scores, ticks, collisions
+
+
+def summarize(level_name, scores, ticks, collisions, elapsed):
+    """collisions — столкновения, не закончившие партию (уровни с crash_ends_game=False)."""
+    return {
+        'level': level_name, 'episodes': len(scores),
+        'score_mean': round(statistics.fmean(scores), 1), 'score_min': min(scores), 'score_max': max(scores),
+        'ticks_mean': round(statistics.fmean(ticks), 1), 'ticks_total': sum(ticks),
+        'collisions_mean': round(statistics.fmean(collisions), 1),
+        'episodes_per_sec': round(len(scores) / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Прогон партий 2D Traffic Racer без окна")
+    parser.add_argument('--level', choices=list(LEVEL_SETTINGS) + ['all'], default='all')
+    parser.add_argument('--episodes', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0, help="зерно первой партии, далее seed+1, seed+2, ...")
+    parser.add_argument('--driver', choices=DRIVERS, default='autopilot')
+    parser.add_argument('--max-ticks', type=int, default=FPS * 300, help="ограничение длины партии в тиках")
+    parser.add_argument('--graphics', choices=GRAPHICS_SETTINGS, default='Среднее',
+                        help="качество графики определяет размеры машин")
+    parser.add_argument('--auto-accel', action='store_true', help="режим ускорения 'Авто'")
+    parser.add_argument('--json', action='store_true', help="вывод по строке JSON на уровень")
+    args = parser.parse_args(argv)
+
+    # 'all' — обычные уровни; уровни без конца игры при столкновении (стресс) запускаются только явно
+    levels = list(PLAYABLE_LEVELS) if args.level == 'all' else [args.level]
+    for level_name in levels:
+        started = time.perf_counter()
+        scores, ticks, collisions = run_level(level_name, args.episodes, args.seed, args.driver, args.max_ticks,
+                                              args.graphics, args.auto_accel)
+        summary = summarize(level_name, scores, ticks, collisions, time.perf_counter() - started)
+        if args.json:
+            print(json.dumps(summary, ensure_ascii=False))
+        else:
+            print(f"{level_name}: {summary['episodes']} партий, счёт {summary['score_mean']} "
+                  f"[{summary['score_min']}..{summary['score_max']}], тиков в среднем {summary['ticks_mean']}, "
+                  + (f"столкновений в среднем {summary['collisions_mean']}, " if any(collisions) else "")
+                  + f"{summary['episodes_per_sec']} партий/с")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
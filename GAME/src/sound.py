@@ -0,0 +1,120 @@
+"""Звук игры: QSoundEffect трогается только при смене состояния канала.
+
+Непрерывные звуки (газ, тормоз) — каналы с желаемым состоянием «играет/молчит»:
+set_channel каждый тик сравнивает флаг и обращается к QtMultimedia лишь на переходе.
+Короткие звуки (сигнал, авария) играются из небольшого пула голосов, чтобы
+наложение не обрывало предыдущее воспроизведение. Громкость применяется ко всем
+эффектам один раз при её изменении.
+"""
+import os
+
+from engine import BASE_DIR
+
+# --- Безопасный импорт мультимедиа-компонентов для предотвращения сбоев ---
+# QtMultimedia импортируется только при первой загрузке звуков: сам импорт заметно
+# удлиняет запуск, а меню звук не нужен
+sound_class = None
+sound_url_class = None
+sound_enabled = None
+
+
+def load_backend():
+    """Импортирует QtMultimedia при первом вызове; возвращает, доступен ли звук."""
+    global sound_class, sound_url_class, sound_enabled
+    if sound_enabled is not None: return sound_enabled
+    try:
+        from PyQt6.QtMultimedia import QSoundEffect
+        from PyQt6.QtCore import QUrl
+
+        sound_class = QSoundEffect
+        sound_url_class = QUrl
+        sound_enabled = True
+    except (ImportError, ModuleNotFoundError):
+        print("ПРЕДУПРЕЖДЕНИЕ: PyQt6-Multimedia не найден или вызвал ошибку. Запуск без звука.")
+        sound_enabled = False
+    return sound_enabled
+
+
+SOUND_FILES = {
+    'gas': os.path.join('assets', 'sounds', 'gas.wav'), 'brake': os.path.join('assets', 'sounds', 'brake.wav'),
+    'honk': os.path.join('assets', 'sounds', 'honk.wav'), 'crash': os.path.join('assets', 'sounds', 'crash.wav')
+}
+# Каналы повторяются, пока включены: раньше газ и тормоз перезапускались каждый тик, если доиграли
+CHANNELS = ('gas', 'brake')
+# Число одновременных голосов для коротких звуков
+VOICES = {'honk': 3, 'crash': 2}
+LOOP_INFINITE = -2  # QSoundEffect.Loop.Infinite
+
+
+class SoundManager:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.loaded = False
+        self.volume = None
+        self.effects = []
+        self.channel_effects = {}
+        self.channel_state = dict.fromkeys(CHANNELS, False)
+        self.voices = {}
+        self.next_voice = dict.fromkeys(VOICES, 0)
+
+    def load(self):
+        """Создаёт все эффекты заранее; до вызова любые команды просто игнорируются."""
+        if self.loaded: return
+        self.loaded = True
+        if not load_backend(): return
+        for name, path in SOUND_FILES.items():
+            full_path = os.path.join(BASE_DIR, path)
+            if not os.path.exists(full_path):
+                print(f"Warning: Sound not found at {full_path}")
+                continue
+            count = VOICES.get(name, 1)
+            effects = [self._create_effect(full_path) for _ in range(count)]
+            if name in CHANNELS:
+                effects[0].setLoopCount(LOOP_INFINITE)
+                self.channel_effects[name] = effects[0]
+                if self.channel_state[name]: effects[0].play()
+            else:
+                self.voices[name] = effects
+        if self.volume is not None: self._apply_volume()
+
+    def _create_effect(self, full_path):
+        effect = sound_class(self.parent)
+        effect.setSource(sound_url_class.fromLocalFile(full_path))
+        self.effects.append(effect)
+        return effect
+
+    def set_volume(self, volume_percent):
+        volume = volume_percent / 100.0
+        if volume == self.volume: return
+        self.volume = volume
+        self._apply_volume()
+
+    def _apply_volume(self):
+        for effect in self.effects: effect.setVolume(self.volume)
+
+    def set_channel(self, name, playing):
+        """Включает или выключает непрерывный звук; без смены состояния ничего не делает."""
+        if self.channel_state[name] == playing: return
+        self.channel_state[name] = playing
+        effect = self.channel_effects.get(name)
+        if effect is None: return
+        if playing:
+            effect.play()
+        else:
+            effect.stop()
+
+    def play(self, name):
+        """Проигрывает короткий звук свободным голосом, а если все заняты — самым давним."""
+        voices = self.voices.get(name)
+        if not voices: return
+        start = self.next_voice[name]
+        for k in range(len(voices)):
+            index = (start + k) % len(voices)
+            if not voices[index].isPlaying(): break
+        else:
+            index = start
+        self.next_voice[name] = (index + 1) % len(voices)
+        voices[index].play()
+
+    def stop_channels(self):
+        for name in CHANNELS: self.set_channel(name, False)
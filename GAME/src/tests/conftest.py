@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули игры импортируют друг друга по имени, как при запуске из GAME/src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
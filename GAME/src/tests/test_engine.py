@@ -0,0 +1,62 @@
+"""Столкновения GameEngine (корзины полос + узкая фаза) против полного перебора машин."""
+import pytest
+
+from engine import PLAYABLE_LEVELS, GameEngine
+from simulate import DRIVERS
+
+
+def crashes_brute_force(engine):
+    """Пересекает ли игрок хоть одну машину — та же проверка, что у QRect.intersects, по всем машинам."""
+    pool = engine.enemies
+    left, top = engine.player_x, engine.player_y
+    right, bottom = left + engine.player_w - 1, top + engine.player_h - 1
+    return any(pool.x[i] <= right and left <= pool.x[i] + pool.w[i] - 1
+               and pool.y[i] <= bottom and top <= pool.y[i] + pool.h[i] - 1 for i in range(pool.count))
+
+
+def check_lanes(pool):
+    """Каждая живая машина лежит ровно в корзинах своего диапазона x, и других индексов в корзинах нет."""
+    expected = [[] for _ in pool.lanes]
+    for i in range(pool.count):
+        first, last = pool.lane_span(pool.x[i], pool.w[i])
+        for lane in range(first, last + 1): expected[lane].append(i)
+    assert [sorted(lane) for lane in pool.lanes] == expected
+
+
+@pytest.mark.parametrize('level_name', PLAYABLE_LEVELS)
+@pytest.mark.parametrize('driver_name', ['random', 'autopilot'])
+def test_crash_matches_brute_force(level_name, driver_name):
+    engine = GameEngine(level_name)
+    crashes = 0
+    for seed in range(20):
+        engine.reset(seed)
+        drive = DRIVERS[driver_name](seed)
+        for _ in range(3000):
+            running = engine.step(drive(engine))
+            assert (not running) == crashes_brute_force(engine), (seed, engine.ticks)
+            if not running: break
+        crashes += not running
+        check_lanes(engine.enemies)
+    assert crashes
+
+
+def test_stress_collisions_match_brute_force():
+    """На стресс-уровне столкновение не заканчивает партию, а только считается."""
+    engine = GameEngine('Стресс', seed=1)
+    drive = DRIVERS['random'](1)
+    for _ in range(900):
+        collisions = engine.collisions
+        assert engine.step(drive(engine))
+        assert engine.collisions - collisions == int(crashes_brute_force(engine)), engine.ticks
+    assert engine.enemies.count > 1000
+    check_lanes(engine.enemies)
+
+
+def test_same_seed_same_game():
+    scores = []
+    for _ in range(2):
+        engine = GameEngine('Сложный', seed=5)
+        drive = DRIVERS['random'](5)
+        while engine.step(drive(engine)) and engine.ticks < 5000: pass
+        scores.append((engine.score, engine.ticks))
+    assert scores[0] == scores[1]
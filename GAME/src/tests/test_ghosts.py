@@ -0,0 +1,76 @@
+"""Протокол призраков: записи состояний и снимки комнаты кодируются и раскодируются без потерь."""
+import random
+
+from ghosts import (_ID, _SNAPSHOT, _LENGTH, F_ABSOLUTE, F_GONE, SNAPSHOT_KEYFRAME, UNCHANGED_RECORD, GhostRoom,
+                    decode_record, encode_record, quantize, record_size)
+
+
+def random_walk(rng, state):
+    x, y, speed, score = state
+    if rng.random() < 0.1:
+        # Скачок, который не помещается в однобайтовую дельту
+        return rng.randint(-32768, 32767), rng.randint(-32768, 32767), rng.randint(-32768, 32767), score + 1000
+    clamp = lambda value: max(-32768, min(32767, value))
+    return (clamp(x + rng.randint(-3, 3)), clamp(y + rng.randint(-200, 200)),
+            clamp(speed + rng.choice((0, 0, 1, -1))), score + rng.choice((0, 0, 1, 150)))
+
+
+def test_record_round_trip():
+    rng = random.Random(1)
+    prev = None
+    state = quantize(400, 600, 0.0, 0)
+    for _ in range(5000):
+        record = encode_record(prev, state)
+        decoded, offset = decode_record(record, 0, prev)
+        assert decoded == state
+        assert offset == len(record) == record_size(record[0])
+        if prev is not None and all(abs(a - b) <= 127 for a, b in zip(prev[:3], state[:3])) \
+                and 0 <= state[3] - prev[3] <= 255:
+            assert not record[0] & F_ABSOLUTE
+        prev, state = state, random_walk(rng, state)
+
+
+def test_unchanged_state_is_one_byte():
+    state = quantize(10, 20, 1.5, 300)
+    assert encode_record(state, state) == UNCHANGED_RECORD
+
+
+def decode_snapshot(message, known):
+    """Применяет снимок комнаты к known, как GhostClient._receive; возвращает флаги снимка."""
+    (length,) = _LENGTH.unpack_from(message)
+    assert length == len(message) - _LENGTH.size
+    _, flags, _, count = _SNAPSHOT.unpack_from(message, _LENGTH.size)
+    if flags & SNAPSHOT_KEYFRAME: known.clear()
+    offset = _LENGTH.size + _SNAPSHOT.size
+    for _ in range(count):
+        (player,) = _ID.unpack_from(message, offset)
+        offset += _ID.size
+        assert message[offset] & (F_ABSOLUTE | F_GONE) or player in known
+        state, offset = decode_record(message, offset, known.get(player))
+        if state is None:
+            del known[player]
+        else:
+            known[player] = state
+    assert offset == len(message)
+    return flags
+
+
+def test_room_deltas_and_keyframes():
+    rng = random.Random(2)
+    room = GhostRoom()
+    client = {}
+    for seq in range(2000):
+        # Игроки входят, выходят и двигаются
+        if rng.random() < 0.05 and len(room.states) < 20:
+            room.states[rng.randrange(1000)] = quantize(rng.randint(0, 800), rng.randint(0, 700), 0.0, 0)
+        if rng.random() < 0.03 and room.states:
+            del room.states[rng.choice(list(room.states))]
+        for player, state in room.states.items():
+            room.states[player] = random_walk(rng, state)
+        assert decode_snapshot(room.encode_delta(seq), client) == 0
+        assert client == room.states
+        if seq % 100 == 0:
+            # Новый клиент начинает с ключевого снимка и дальше идёт по тем же дельтам
+            late = {}
+            assert decode_snapshot(room.encode_keyframe(seq), late) == SNAPSHOT_KEYFRAME
+            assert late == room.states
@@ -0,0 +1,111 @@
+"""Хранилища результатов: top-K и процентили против сортировки всех заездов."""
+import json
+import random
+
+import pytest
+
+from score_store import JsonScoreStore, SqliteScoreStore
+
+LEVELS = ('Легкий', 'Сложный')
+
+
+def expected_percentile(scores, percent):
+    scores = sorted(scores)
+    return scores[min(len(scores) - 1, max(0, -(-len(scores) * percent // 100) - 1))] if scores else None
+
+
+def check_queries(store, entries):
+    for level in (None,) + LEVELS:
+        scores = [entry['score'] for entry in entries if level is None or entry['level'] == level]
+        assert store.count(level) == len(scores)
+        assert [entry['score'] for entry in store.top(level, 7)] == sorted(scores, reverse=True)[:7]
+        for score in range(-1, 52, 5):
+            expected = 100.0 * sum(1 for s in scores if s < score) / len(scores) if scores else 0.0
+            assert store.percentile_rank(level, score) == pytest.approx(expected)
+        for percent in range(0, 101, 9):
+            assert store.score_at_percentile(level, percent) == expected_percentile(scores, percent)
+
+
+def random_entries(rng, count):
+    return [{'score': rng.randint(0, 50), 'level': rng.choice(LEVELS), 'player': 'test'} for _ in range(count)]
+
+
+def test_sqlite_queries(tmp_path):
+    rng = random.Random(1)
+    store = SqliteScoreStore(str(tmp_path / 'scores.db'))
+    entries = []
+    try:
+        check_queries(store, entries)
+        for _ in range(4):
+            batch = random_entries(rng, 40)
+            store.record_many(batch)
+            entries += batch
+            check_queries(store, entries)
+        store.flush()
+        check_queries(store, entries)
+    finally:
+        store.close()
+    reopened = SqliteScoreStore(str(tmp_path / 'scores.db'))
+    try:
+        check_queries(reopened, entries)
+    finally:
+        reopened.close()
+
+
+def test_sqlite_queries_see_unwritten_runs(tmp_path):
+    """Запросы не ждут фоновую запись: ещё не записанные заезды добавляются к прочитанным из базы."""
+    rng = random.Random(2)
+    store = SqliteScoreStore(str(tmp_path / 'scores.db'))
+    try:
+        entries = random_entries(rng, 30)
+        store.record_many(entries)
+        store.flush()
+        store._writer.wake = lambda: None
+        queued = random_entries(rng, 25)
+        store.record_many(queued)
+        assert len(store._pending) == len(queued)
+        check_queries(store, entries + queued)
+    finally:
+        store.close()
+
+
+def test_sqlite_imports_highscores_once(tmp_path):
+    highscores = tmp_path / 'highscores.json'
+    highscores.write_text(json.dumps([{'score': s, 'level': 'Легкий'} for s in range(10)]), encoding='utf-8')
+    for _ in range(3):
+        store = SqliteScoreStore(str(tmp_path / 'scores.db'), import_from=str(highscores))
+        assert store.count() == 10
+        store.close()
+
+
+def test_sqlite_ties_keep_older_first(tmp_path):
+    store = SqliteScoreStore(str(tmp_path / 'scores.db'))
+    try:
+        store.record({'score': 5, 'level': 'Легкий', 'player': 'old'})
+        store.flush()
+        store._writer.wake = lambda: None
+        store.record({'score': 5, 'level': 'Легкий', 'player': 'new'})
+        assert [entry['player'] for entry in store.top('Легкий')] == ['old', 'new']
+    finally:
+        store.close()
+
+
+def test_json_keeps_best_runs_of_each_level(tmp_path):
+    store = JsonScoreStore(str(tmp_path / 'highscores.json'), keep=10)
+    hard = [{'score': 1000 + i, 'level': 'Сложный'} for i in range(20)]
+    easy = [{'score': i, 'level': 'Легкий'} for i in range(20)]
+    store.record_many(hard + easy)
+    store.flush()
+    assert [entry['score'] for entry in store.top('Легкий')] == list(range(19, 9, -1))
+    assert [entry['score'] for entry in store.top(None, 3)] == [1019, 1018, 1017]
+    reopened = JsonScoreStore(str(tmp_path / 'highscores.json'), keep=10)
+    assert reopened.count('Легкий') == reopened.count('Сложный') == 10
+
+
+def test_json_queries(tmp_path):
+    rng = random.Random(3)
+    store = JsonScoreStore(str(tmp_path / 'highscores.json'), keep=1000)
+    entries = random_entries(rng, 60)
+    store.record_many(entries)
+    check_queries(store, entries)
+    store.flush()
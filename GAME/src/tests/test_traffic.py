@@ -0,0 +1,84 @@
+"""Расписания движения: запись и чтение, совпадение с игрой на зерне, повреждённые файлы, круги."""
+import pytest
+
+from engine import GameEngine, sprite_sizes
+from replay import Recorder, Recording, ReplayError, verify as verify_replay
+from simulate import DRIVERS
+from traffic import _HEADER, TrafficError, TrafficSchedule, ScheduleSource, generate, verify, write_schedule
+
+_, ENEMY_SIZES = sprite_sizes()
+
+
+@pytest.fixture
+def schedule_path(tmp_path):
+    path = str(tmp_path / 'hard.pgts')
+    write_schedule(path, 'Сложный', 7, 3000, ENEMY_SIZES)
+    return path
+
+
+def test_round_trip(schedule_path):
+    with TrafficSchedule(schedule_path) as schedule:
+        assert (schedule.level_name, schedule.seed, schedule.ticks) == ('Сложный', 7, 3000)
+        assert schedule.enemy_sizes == tuple(ENEMY_SIZES)
+        records = [schedule.record(i) for i in range(schedule.count)]
+    expected = list(generate('Сложный', 7, 3000, ENEMY_SIZES))
+    assert records == [tuple(record) for record in expected]
+    assert records
+
+
+@pytest.mark.parametrize('driver_name', ['idle', 'random', 'autopilot'])
+def test_schedule_matches_seeded_game(schedule_path, driver_name):
+    with TrafficSchedule(schedule_path) as schedule:
+        ok, ticks = verify(schedule, driver_name)
+        assert ok and ticks > 0
+
+
+def test_scheduled_game_ends_with_schedule(schedule_path):
+    with TrafficSchedule(schedule_path) as schedule:
+        engine = GameEngine(schedule.level_name, enemy_sizes=schedule.enemy_sizes, seed=schedule.seed,
+                            spawn_source=ScheduleSource(schedule))
+        engine.crash_ends_game = False
+        while engine.step(0): pass
+        assert engine.ticks == schedule.ticks
+
+
+def test_scheduled_replay(schedule_path):
+    with TrafficSchedule(schedule_path) as schedule:
+        engine = GameEngine(schedule.level_name, enemy_sizes=schedule.enemy_sizes, seed=schedule.seed,
+                            spawn_source=ScheduleSource(schedule, loop=True))
+        recorder = Recorder(engine)
+        drive = DRIVERS['random'](1)
+        while engine.ticks < 5000:
+            inputs = drive(engine)
+            recorder.record(inputs)
+            if not engine.step(inputs): break
+        recording = Recording.from_bytes(recorder.finish(engine).to_bytes())
+        assert recording.traffic.matches(schedule) and recording.traffic.loop
+        assert verify_replay(recording, schedule) == (True, engine.score)
+        with pytest.raises(ReplayError):
+            verify_replay(recording)
+
+
+def test_loop_keeps_every_scheduled_car(tmp_path):
+    """На стыке кругов на дороге ещё машины прошлого круга; пул расширяется, а не теряет машины."""
+    path = str(tmp_path / 'stress.pgts')
+    write_schedule(path, 'Стресс', 1, 300, ENEMY_SIZES)
+    with TrafficSchedule(path) as schedule:
+        engine = GameEngine(schedule.level_name, enemy_sizes=schedule.enemy_sizes, seed=schedule.seed,
+                            spawn_source=ScheduleSource(schedule, loop=True))
+        for _ in range(schedule.ticks * 4): engine.step(0)
+        assert engine.enemies.next_serial == schedule.count * 4
+
+
+def test_corrupt_files_rejected(schedule_path, tmp_path):
+    with open(schedule_path, 'rb') as f:
+        data = f.read()
+    level_offset = _HEADER.size + 4 * len(ENEMY_SIZES)
+    broken = bytearray(data)
+    broken[level_offset + 1] = 0xFF  # не UTF-8 в имени уровня
+    candidates = [data[:length] for length in (0, 3, _HEADER.size, _HEADER.size + 2, level_offset + 3, len(data) - 1)]
+    for i, candidate in enumerate(candidates + [b'XXXX' + data[4:], bytes(broken)]):
+        path = tmp_path / f'broken{i}.pgts'
+        path.write_bytes(candidate)
+        with pytest.raises(TrafficError):
+            TrafficSchedule(str(path))
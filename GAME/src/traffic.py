@@ -0,0 +1,283 @@
+"""Заранее рассчитанные расписания движения и их потоковое чтение.
+
+Движение соперников не зависит от игрока: машины появляются по таймеру, пока на дороге
+есть место, и исчезают, уйдя за нижний край. Поэтому весь поток машин уровня однозначно
+задан зерном и его можно рассчитать заранее. Расписание — бинарный файл: заголовок
+(уровень, зерно, длина в тиках, размеры поля и машин) и записи фиксированной длины
+(тик появления, x, y, скорость в 1/256 px за тик, номер спрайта).
+
+Игра читает расписание через mmap и держит в памяти только текущую запись, так что
+расписание на многочасовой турнир занимает постоянную память. Когда расписание кончается,
+заезд заканчивается; с PYGAME_TRAFFIC_LOOP=1 расписание начинается заново. Запись такой
+партии хранит путь, хеш и длину расписания, и replay.py verify проигрывает её по нему же.
+
+    python traffic.py generate --level Сложный --seed 7 --minutes 600 --out hard.pgts
+    python traffic.py info hard.pgts
+    python traffic.py verify hard.pgts
+    PYGAME_TRAFFIC=hard.pgts python main.py
+    python replay.py verify --traffic hard.pgts replays/*.rpl
+"""
+import argparse
+import hashlib
+import heapq
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+from engine import (SCREEN_WIDTH, SCREEN_HEIGHT, FPS, LEVEL_SETTINGS, GRAPHICS_SETTINGS, SPAWN_MARGIN, MAX_ENEMIES,
+                    GameEngine, sprite_sizes)
+
+TRAFFIC_ENV = 'PYGAME_TRAFFIC'
+TRAFFIC_LOOP_ENV = 'PYGAME_TRAFFIC_LOOP'
+TRAFFIC_MAGIC = b'PGTS'
+TRAFFIC_VERSION = 1
+SPEED_SCALE = 256  # скорость хранится в 1/256 px за тик; int() от неё совпадает с int() исходной скорости
+
+# magic, версия, флаги, зерно, длина в тиках, число записей, ширина и высота поля, число спрайтов
+_HEADER = struct.Struct('<4sBBQIIHHB')
+_SIZE = struct.Struct('<HH')
+# тик появления, x, y, скорость * SPEED_SCALE, спрайт (+1 байт выравнивания)
+_RECORD = struct.Struct('<IHhHBx')
+
+
+class TrafficError(ValueError):
+    pass
+
+
+def generate(level_name, seed, ticks, enemy_sizes, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+    """Записи (тик, x, y, скорость в 1/SPEED_SCALE, спрайт) в порядке появления, как их создал бы GameEngine.
+
+    ГСЧ вызывается в том же порядке, что в GameEngine.spawn_enemy. Сами машины не
+    моделируются: тик ухода каждой за нижний край известен в момент появления.
+    """
+    conf = LEVEL_SETTINGS[level_name]
+    rng = random.Random(seed)
+    spawn_rate = conf['spawn_rate']
+    speed_min, speed_max = conf['enemy_speed_min'], conf['enemy_speed_max']
+    max_enemies = conf.get('max_enemies', MAX_ENEMIES)
+    spawn_batch = conf.get('spawn_batch', 1)
+    limit = height + 100
+    sprites = range(len(enemy_sizes))
+    leaving = []  # куча тиков, на которых машины уходят с дороги
+    timer = 0
+    for tick in range(1, ticks + 1):
+        # Машина, ушедшая на тике r, освобождает место с тика r + 1
+        while leaving and leaving[0] < tick: heapq.heappop(leaving)
+        timer += 1
+        if timer <= spawn_rate or len(leaving) >= max_enemies: continue
+        timer = 0
+        for _ in range(spawn_batch):
+            if len(leaving) >= max_enemies: break
+            sprite = rng.choice(sprites)
+            x = rng.randint(SPAWN_MARGIN, width - SPAWN_MARGIN - enemy_sizes[sprite][0])
+            y = rng.randint(-300, -150)
+            speed = int(rng.uniform(speed_min, speed_max) * SPEED_SCALE)
+            dy = speed // SPEED_SCALE
+            # Машина сдвигается уже на тике появления и удаляется на первом тике, где y > limit
+            heapq.heappush(leaving, tick + (limit - y) // dy if dy > 0 else float('inf'))
+            yield tick, x, y, speed, sprite
+
+
+def write_schedule(path, level_name, seed, ticks, enemy_sizes, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+    """Пишет расписание потоком, не держа записи в памяти. Возвращает число записей."""
+    level = level_name.encode('utf-8')
+    sizes = b''.join(_SIZE.pack(*size) for size in enemy_sizes)
+    prefix_len = _HEADER.size + len(sizes) + 1 + len(level)
+    padding = b'\0' * (-prefix_len % 4)  # записи выровнены по 4 байта
+    count = 0
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(TRAFFIC_MAGIC, TRAFFIC_VERSION, 0, seed, ticks, 0, width, height, len(enemy_sizes)))
+        f.write(sizes + bytes([len(level)]) + level + padding)
+        chunk = bytearray()
+        pack = _RECORD.pack
+        for record in generate(level_name, seed, ticks, enemy_sizes, width, height):
+            chunk += pack(*record)
+            count += 1
+            if len(chunk) >= 1 << 16:
+                f.write(chunk)
+                chunk.clear()
+        f.write(chunk)
+        # Число записей известно только в конце
+        f.seek(0)
+        f.write(_HEADER.pack(TRAFFIC_MAGIC, TRAFFIC_VERSION, 0, seed, ticks, count, width, height, len(enemy_sizes)))
+    os.replace(tmp_path, path)
+    return count
+
+
+class TrafficSchedule:
+    """Расписание, открытое через mmap; записи читаются по номеру без загрузки файла целиком."""
+
+    def __init__(self, path):
+        self.path = path
+        self._digest = None
+        with open(path, 'rb') as f:
+            try:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # пустой файл
+                raise TrafficError(f"пустой файл расписания: {e}") from e
+        data = self.map
+        if len(data) < _HEADER.size or data[:4] != TRAFFIC_MAGIC:
+            self.close()
+            raise TrafficError("не файл расписания движения")
+        (_, version, _, self.seed, self.ticks, self.count, self.width, self.height,
+         sprite_count) = _HEADER.unpack_from(data)
+        if version != TRAFFIC_VERSION:
+            self.close()
+            raise TrafficError(f"неподдерживаемая версия расписания: {version}")
+        offset = _HEADER.size
+        level_offset = offset + sprite_count * _SIZE.size
+        if level_offset + 1 > len(data) or level_offset + 1 + data[level_offset] > len(data):
+            self.close()
+            raise TrafficError("файл расписания обрезан")
+        self.enemy_sizes = tuple(_SIZE.unpack_from(data, offset + i * _SIZE.size) for i in range(sprite_count))
+        level_len = data[level_offset]
+        offset = level_offset + 1 + level_len
+        try:
+            self.level_name = bytes(data[level_offset + 1:offset]).decode('utf-8')
+        except UnicodeDecodeError as e:
+            self.close()
+            raise TrafficError(f"повреждено имя уровня: {e}") from e
+        if self.level_name not in LEVEL_SETTINGS:
+            self.close()
+            raise TrafficError(f"неизвестный уровень: {self.level_name}")
+        self.data_offset = offset + (-offset % 4)
+        if self.data_offset + self.count * _RECORD.size > len(data):
+            self.close()
+            raise TrafficError("файл расписания обрезан")
+        # Чтение идёт от начала к концу — ядру можно читать страницы наперёд и сразу освобождать
+        if hasattr(mmap, 'MADV_SEQUENTIAL'): self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def record(self, index):
+        return _RECORD.unpack_from(self.map, self.data_offset + index * _RECORD.size)
+
+    @property
+    def digest(self):
+        """8 байт BLAKE2b от всего файла: по нему запись партии находит своё расписание."""
+        if self._digest is None: self._digest = hashlib.blake2b(self.map, digest_size=8).digest()
+        return self._digest
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ScheduleSource:
+    """Источник появления машин для GameEngine(spawn_source=...) по расписанию.
+
+    У каждого движка свой источник, а одно открытое расписание можно делить между ними.
+    Без loop партия заканчивается на последнем тике расписания; с loop=True расписание
+    после конца начинается заново со сдвигом на его длину.
+
+    Расписание рассчитано с пустой дорогой в начале, а на стыке кругов на ней ещё едут машины
+    прошлого круга, и вместе их может оказаться больше max_enemies уровня. Такие машины не
+    отбрасываются: пул соперников расширяется, и каждый круг повторяет расписание целиком.
+    """
+
+    def __init__(self, schedule, loop=False):
+        self.schedule = schedule
+        self.loop = loop
+        self.end_tick = -1 if loop else schedule.ticks
+        self.reset()
+
+    def reset(self):
+        self.index = 0
+        self.tick_offset = 0
+        self._load()
+
+    def _load(self):
+        if self.index >= self.schedule.count:
+            if not self.loop or not self.schedule.count:
+                self.next_tick = -1
+                return
+            self.index = 0
+            self.tick_offset += self.schedule.ticks
+        self.current = self.schedule.record(self.index)
+        self.next_tick = self.current[0] + self.tick_offset
+
+    def spawn(self, engine):
+        if engine.ticks == self.next_tick:
+            pool = engine.enemies
+            sizes = engine.enemy_sizes
+            while engine.ticks == self.next_tick:
+                _, x, y, speed, sprite = self.current
+                w, h = sizes[sprite]
+                if pool.add(x, y, w, h, speed / SPEED_SCALE, sprite) < 0:
+                    pool.reserve(2 * pool.capacity)
+                    pool.add(x, y, w, h, speed / SPEED_SCALE, sprite)
+                self.index += 1
+                self._load()
+        if engine.ticks == self.end_tick: engine.running = False
+
+
+def verify(schedule, driver_name='autopilot', max_ticks=None):
+    """Играет одну партию на зерне расписания дважды — с ГСЧ и с расписанием — и сверяет каждый тик.
+
+    Возвращает (совпало ли, число сыгранных тиков)."""
+    from simulate import DRIVERS
+    ticks = min(max_ticks or schedule.ticks, schedule.ticks)
+    engines = [GameEngine(schedule.level_name, enemy_sizes=schedule.enemy_sizes, width=schedule.width,
+                          height=schedule.height, seed=schedule.seed, spawn_source=source)
+               for source in (None, ScheduleSource(schedule, loop=True))]
+    drivers = [DRIVERS[driver_name](schedule.seed) for _ in engines]
+    for _ in range(ticks):
+        running = [engine.step(drive(engine)) for drive, engine in zip(drivers, engines)]
+        seeded, scheduled = engines
+        if (running[0] != running[1] or seeded.score != scheduled.score
+                or seeded.enemies.count != scheduled.enemies.count):
+            return False, seeded.ticks
+        if not running[0]: break
+    return True, engines[0].ticks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Расписания движения 2D Traffic Racer")
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_parser = commands.add_parser('generate', help="рассчитать расписание уровня")
+    generate_parser.add_argument('--level', choices=LEVEL_SETTINGS, required=True)
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--minutes', type=float, default=60, help="длина расписания")
+    generate_parser.add_argument('--graphics', choices=GRAPHICS_SETTINGS, default='Среднее',
+                                 help="качество графики определяет размеры машин")
+    generate_parser.add_argument('--out', required=True)
+    info_parser = commands.add_parser('info', help="заголовок расписания")
+    info_parser.add_argument('path')
+    verify_parser = commands.add_parser('verify', help="сверить партию по расписанию с партией на том же зерне")
+    verify_parser.add_argument('path')
+    verify_parser.add_argument('--driver', default='autopilot')
+    verify_parser.add_argument('--max-ticks', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        _, enemy_sizes = sprite_sizes(GRAPHICS_SETTINGS[args.graphics])
+        started = time.perf_counter()
+        count = write_schedule(args.out, args.level, args.seed, int(args.minutes * 60 * FPS), enemy_sizes)
+        print(f"{args.out}: {count} машин, {os.path.getsize(args.out)} байт, "
+              f"{time.perf_counter() - started:.1f} с")
+        return 0
+    try:
+        schedule = TrafficSchedule(args.path)
+    except (OSError, TrafficError) as e:
+        print(f"{args.path}: ОШИБКА {e}")
+        return 1
+    with schedule:
+        if args.command == 'info':
+            print(f"{args.path}: уровень {schedule.level_name}, зерно {schedule.seed}, "
+                  f"{schedule.ticks / FPS / 60:.1f} мин, {schedule.count} машин, поле {schedule.width}x"
+                  f"{schedule.height}, спрайты {list(schedule.enemy_sizes)}")
+            return 0
+        ok, ticks = verify(schedule, args.driver, args.max_ticks)
+        print(f"{args.path}: {'OK' if ok else 'НЕ СОВПАДАЕТ'} ({ticks} тиков)")
+        return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Подбор сложности: сетка параметров уровня, прогнанная на пуле процессов.
+
+Каждая конфигурация — базовый уровень из LEVEL_SETTINGS с подменёнными параметрами.
+Все конфигурации играются на одних и тех же зёрнах (seed, seed+1, ...), поэтому разница
+между ними — от параметров, а не от везения, и результат не зависит от числа процессов:
+
+    python tune.py --level Средний --set enemy_speed_min=4,6,8 --set spawn_rate=30,50,70 --episodes 500
+    python tune.py --level Сложный --set enemy_speed_max=12,14,16 --driver random --out hard.jsonl
+
+На каждую конфигурацию выводится строка JSON: параметры, доля партий, закончившихся
+аварией до --max-ticks, среднее число столкновений, не закончивших партию (уровни без
+конца игры при аварии), и квантили времени жизни (секунды) и счёта.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+from engine import LEVEL_SETTINGS, GRAPHICS_SETTINGS, FPS, GameEngine, sprite_sizes
+from simulate import DRIVERS, run_episode
+
+TUNABLE = ('enemy_speed_min', 'enemy_speed_max', 'spawn_rate', 'max_enemies', 'spawn_batch')
+QUANTILES = (10, 25, 50, 75, 90)
+CHUNK_EPISODES = 50  # партий в одном задании пула: мельче — ровнее загрузка, крупнее — меньше пересылок
+
+
+def parse_grid(assignments):
+    """['spawn_rate=30,50', ...] -> {'spawn_rate': [30, 50], ...}"""
+    grid = {}
+    for assignment in assignments:
+        name, _, values = assignment.partition('=')
+        if name not in TUNABLE:
+            raise ValueError(f"неизвестный параметр {name!r}, доступны: {', '.join(TUNABLE)}")
+        grid[name] = [float(v) if '.' in v else int(v) for v in values.split(',') if v]
+        if not grid[name]: raise ValueError(f"для {name} не заданы значения")
+    return grid
+
+
+def expand_grid(level_name, grid):
+    """Все сочетания значений; сочетания с enemy_speed_min > enemy_speed_max пропускаются."""
+    names = list(grid)
+    configs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        overrides = dict(zip(names, values))
+        conf = {**LEVEL_SETTINGS[level_name], **overrides}
+        if conf['enemy_speed_min'] > conf['enemy_speed_max']: continue
+        configs.append(overrides)
+    return configs
+
+
+def run_chunk(task):
+    """Задание пула: партии [first, first + count) одной конфигурации. Возвращает компактные списки."""
+    config_index, level_name, overrides, driver_name, first_seed, count, max_ticks, graphics, auto_accel = task
+    player_size, enemy_sizes = sprite_sizes(GRAPHICS_SETTINGS[graphics])
+    engine = GameEngine(level_name, player_size, enemy_sizes, auto_accel=auto_accel, level_overrides=overrides)
+    scores, ticks, crashes, collisions = [], [], [], []
+    for seed in range(first_seed, first_seed + count):
+        score, survived, crashed = run_episode(engine, DRIVERS[driver_name](seed), seed, max_ticks)
+        scores.append(score)
+        ticks.append(survived)
+        crashes.append(crashed)
+        collisions.append(engine.collisions)
+    return config_index, first_seed, scores, ticks, crashes, collisions
+
+
+def quantiles(values):
+    cuts = statistics.quantiles(values, n=100, method='inclusive') if len(values) > 1 else list(values) * 99
+    return {f"p{q}": round(cuts[q - 1], 1) for q in QUANTILES}
+
+
+def summarize(level_name, overrides, scores, ticks, crashes, collisions):
+    """collisions — столкновения, не закончившие партию (уровни с crash_ends_game=False)."""
+    seconds = [t / FPS for t in ticks]
+    return {
+        'level': level_name, 'overrides': overrides, 'episodes': len(scores),
+        'crash_rate': round(sum(crashes) / len(crashes), 3),
+        'collisions_mean': round(statistics.fmean(collisions), 1),
+        'survival_s': {'mean': round(statistics.fmean(seconds), 1), **quantiles(seconds)},
+        'score': {'mean': round(statistics.fmean(scores), 1), **quantiles(scores)},
+    }
+
+
+def tune(level_name, grid, episodes, base_seed=0, driver_name='autopilot', max_ticks=FPS * 120,
+         graphics='Среднее', auto_accel=False, workers=None):
+    configs = expand_grid(level_name, grid)
+    tasks = [(index, level_name, overrides, driver_name, base_seed + start, min(CHUNK_EPISODES, episodes - start),
+              max_ticks, graphics, auto_accel)
+             for index, overrides in enumerate(configs) for start in range(0, episodes, CHUNK_EPISODES)]
+    # Результаты раскладываются по смещению зерна, так что порядок завершения заданий ничего не меняет
+    scores = [[0] * episodes for _ in configs]
+    ticks = [[0] * episodes for _ in configs]
+    crashes = [[False] * episodes for _ in configs]
+    collisions = [[0] * episodes for _ in configs]
+    with multiprocessing.Pool(workers or os.cpu_count()) as pool:
+        for index, first_seed, *chunk in pool.imap_unordered(run_chunk, tasks):
+            offset = first_seed - base_seed
+            for results, values in zip((scores, ticks, crashes, collisions), chunk):
+                results[index][offset:offset + len(values)] = values
+    return [summarize(level_name, overrides, scores[i], ticks[i], crashes[i], collisions[i])
+            for i, overrides in enumerate(configs)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Подбор параметров сложности 2D Traffic Racer")
+    parser.add_argument('--level', choices=LEVEL_SETTINGS, default='Средний', help="базовый уровень")
+    parser.add_argument('--set', action='append', default=[], metavar='PARAM=V1,V2,...',
+                        help=f"значения параметра для сетки ({', '.join(TUNABLE)}); без --set — текущий уровень")
+    parser.add_argument('--episodes', type=int, default=500, help="партий на конфигурацию")
+    parser.add_argument('--seed', type=int, default=0, help="зерно первой партии каждой конфигурации")
+    parser.add_argument('--driver', choices=DRIVERS, default='autopilot')
+    parser.add_argument('--max-ticks', type=int, default=FPS * 120, help="партия дольше считается пережитой")
+    parser.add_argument('--graphics', choices=GRAPHICS_SETTINGS, default='Среднее')
+    parser.add_argument('--auto-accel', action='store_true', help="режим ускорения 'Авто'")
+    parser.add_argument('--workers', type=int, help="число процессов (по умолчанию все ядра)")
+    parser.add_argument('--out', help="дописать строки JSON в файл вместо stdout")
+    args = parser.parse_args(argv)
+    try:
+        grid = parse_grid(args.set)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    results = tune(args.level, grid, args.episodes, args.seed, args.driver, args.max_ticks, args.graphics,
+                   args.auto_accel, args.workers)
+    elapsed = time.perf_counter() - started
+    lines = [json.dumps(result, ensure_ascii=False) for result in results]
+    if args.out:
+        with open(args.out, 'a', encoding='utf-8') as f: f.write('\n'.join(lines) + '\n')
+    else:
+        print('\n'.join(lines))
+    for result in results:
+        print(f"{json.dumps(result['overrides'], ensure_ascii=False):50} аварий {result['crash_rate']:.0%}, "
+              f"жизнь p50 {result['survival_s']['p50']} с, счёт p50 {result['score']['p50']}", file=sys.stderr)
+    print(f"{len(results)} конфигураций × {args.episodes} партий за {elapsed:.1f} с", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())